@@ -8,25 +8,1008 @@ Slum News Mapper - REFINED VERSION
 """
 
 import requests
+import argparse
+import copy
 import re
 import json
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import time
-from collections import defaultdict, Counter
+from collections import defaultdict, deque, Counter, OrderedDict
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 import hashlib
+import heapq
+import glob
+import gzip
 import math
+import os
+import pickle
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import unicodedata
+from html import escape as html_escape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
 
-class RefinedSlumMapper:
+try:
+    import brotli
+except ImportError:  # Optional: .br siblings are skipped without it
+    brotli = None
+
+# MAP PAGE TEMPLATES
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+ASSET_DIR = 'assets'  # Hashed CSS/JS are written here, next to the page
+
+# QUERY SCHEDULER TUNING
+QUERY_STATS_FILE = 'query_yields.json'
+HIGH_YIELD_THRESHOLD = 2.0   # Smoothed articles per run needed to run a query every time
+YIELD_SMOOTHING = 0.5        # Weight of the previous average when folding in a new run
+MAX_QUERY_INTERVAL = 16      # Longest gap (in runs) between samples of a low-yield query
+
+# ARTICLE ENRICHMENT (opt-in)
+ARTICLE_CACHE_DIR = os.path.join('cache', 'articles')
+ENRICH_WORKERS = 8            # Concurrent downloads overall
+ENRICH_PER_DOMAIN = 2         # Concurrent downloads per domain
+ENRICH_DOMAIN_DELAY = 1.0     # Seconds between request starts to the same domain
+ENRICH_MAX_BODY_CHARS = 20000
+ENRICH_RETRY_STATUSES = {403, 408, 429}  # Blocks, timeouts and rate limits: not cached, retried next run
+ENRICH_USER_AGENT = 'permanence.dev slum news mapper (+https://permanence-observatory.github.io)'
+
+# CHECKPOINTS
+RUN_DIR = os.path.join('cache', 'run')  # Per-query results and processed event batches
+PROCESS_BATCH_SIZE = 500                # Articles per checkpointed processing batch
+RUN_COMPLETE_FILE = 'complete.json'     # Marks a run directory whose run finished; --resume ignores it
+RUN_STARTED_FILE = 'started.json'       # When the run that owns the checkpoints started
+RESUME_MAX_AGE = timedelta(hours=12)    # Older checkpoints are stale: the next daily run starts fresh
+
+# DELTA FEEDS
+FEED_DIR = 'feeds'                      # Per-run delta files, the feed index and the known event IDs
+FEED_BASE_URL = 'https://permanence-observatory.github.io/feeds/'
+FEED_MAX_ITEMS = 50                     # Deltas listed in feed.json; older delta files are removed
+
+# GEONAMES GAZETTEER (optional, loaded from a local dump with --gazetteer)
+GAZETTEER_CACHE_DIR = os.path.join('cache', 'gazetteer')  # Compiled columns and trie, keyed by dump
+GAZETTEER_FORMAT = 1                   # Bump when the compiled layout changes
+GAZETTEER_CITY_CODES = {'PPL', 'PPLA', 'PPLA2', 'PPLA3', 'PPLA4', 'PPLC', 'PPLG', 'PPLS'}
+GAZETTEER_SLUM_CODES = {'PPLX'}        # Sections of populated places (neighbourhoods)
+GAZETTEER_MIN_POPULATION = 5000        # Smaller towns are skipped; neighbourhoods are always kept
+GAZETTEER_MIN_NAME_LENGTH = 4          # Shorter names collide with ordinary words
+GEONAMES_KEY_PREFIX = 'geonames:'      # Location keys of gazetteer places (vs. location_db keys)
+WORD_RE = re.compile(r'\w+')
+# ISO codes of the countries covered by location_db, mapped to its country names
+GAZETTEER_COUNTRIES = {
+    'DZ': 'Algeria', 'AO': 'Angola', 'AR': 'Argentina', 'BD': 'Bangladesh', 'BO': 'Bolivia',
+    'BR': 'Brazil', 'CM': 'Cameroon', 'CL': 'Chile', 'CO': 'Colombia', 'CU': 'Cuba',
+    'CD': 'DRC', 'EC': 'Ecuador', 'EG': 'Egypt', 'ET': 'Ethiopia', 'GH': 'Ghana',
+    'IN': 'India', 'ID': 'Indonesia', 'CI': 'Ivory Coast', 'KE': 'Kenya', 'MG': 'Madagascar',
+    'MY': 'Malaysia', 'MX': 'Mexico', 'MA': 'Morocco', 'MZ': 'Mozambique', 'NG': 'Nigeria',
+    'PK': 'Pakistan', 'PY': 'Paraguay', 'PE': 'Peru', 'PH': 'Philippines', 'SA': 'Saudi Arabia',
+    'SN': 'Senegal', 'ZA': 'South Africa', 'TZ': 'Tanzania', 'TH': 'Thailand', 'TN': 'Tunisia',
+    'UG': 'Uganda', 'UY': 'Uruguay', 'VE': 'Venezuela', 'VN': 'Vietnam', 'ZM': 'Zambia',
+    'ZW': 'Zimbabwe',
+}
+
+# EXTRACTION MEMO
+EXTRACTION_CACHE_FILE = os.path.join('cache', 'extraction.json')
+EXTRACTION_CACHE_SIZE = 100000  # Entries kept (least recently used are evicted)
+
+# PIPELINE STAGES
+STAGE_DIR = os.path.join('cache', 'stages')  # articles.json (fetch) and events.json (process)
+STAGES = ['fetch', 'process', 'render', 'stats', 'all', 'merge']
+
+# ROLLING STATISTICS
+ROLLING_STATS_FILE = 'rolling_stats.json'   # Per-day buckets and 7/30/90-day totals, updated each run
+ROLLING_WINDOWS = [7, 30, 90]
+ROLLING_DIMENSIONS = {'event_type': 'event_type', 'country': 'country', 'location': 'address', 'source': 'source'}
+
+# SHARDING
+SHARD_DIR = 'shards'  # Partial results written by --shard-index/--shard-count runs
+
+# Disk-backed dedup and date sort of fetched articles (--sort-buffer)
+SPILL_DIR = 'spill'             # Sorted runs, under the run directory
+EXTERNAL_MERGE_FAN_IN = 16      # Runs merged at once; more are first merged in rounds
+SPILL_READ_BUFFER = 64 * 1024   # Read buffer per open run during a merge
+SPILL_RECORD_OVERHEAD = 160     # Bytes of the tuples and list slot holding each buffered record
+MIN_SORT_BUFFER_MB = 8
+TRACKING_PARAMS = ('utm_', 'fbclid=', 'gclid=', 'mc_cid=', 'mc_eid=')
+
+# Per-region pages (country/<slug>/, city/<slug>/) and the global overview/ page
+REGION_PAGE_DIRS = {'country': 'country', 'city': 'city'}
+OVERVIEW_DIR = 'overview'
+REGION_PAGE_WORKERS = 4     # Processes rendering pages concurrently
+CITY_PAGE_MIN_EVENTS = 3    # Cities with fewer events only appear on their country page
+REGION_PAGE_ZOOM = {'country': 5, 'city': 11}
+
+# TEXT MATCHING
+EVENT_TYPES = ['eviction', 'demolition', 'protest', 'fire', 'flood', 'land_rights', 'disease', 'development']
+EVENT_TITLE_CHARS = 150  # Title length kept when events are serialized
+LOCATION_TIERS = ['slum', 'city', 'country']  # Most to least specific
+SHARED_PARTITION = 'shared'                     # Language-neutral matcher partition
+GDELT_LANGUAGES = {'english': 'en', 'portuguese': 'pt', 'spanish': 'es', 'french': 'fr'}
+
+# Affected-count patterns, tried in order; group 1 is a number or one of AFFECTED_COUNT_WORDS
+AFFECTED_COUNT_PATTERNS = [
+    r'(\d+,?\d*)\s+(families|households|people|residents|persons|individuals)',
+    r'(hundreds|thousands|millions)\s+(?:of\s+)?(families|households|people|residents)',
+    r'(\d+,?\d*)\s+were\s+(evicted|displaced|affected|homeless)',
+    r'over\s+(\d+,?\d*)\s+people',
+    r'more than\s+(\d+,?\d*)\s+people',
+    r'(\d+,?\d*)\s+to\s+(\d+,?\d*)\s+people',
+    r'(\d+)\s+(evacuated|relocated|moved)'
+]
+AFFECTED_COUNT_WORDS = {'hundreds': 300, 'thousands': 2000, 'millions': 100000}
+
+# SPATIAL CLUSTERING
+CLUSTER_RADIUS_KM = 2.0       # Events within this haversine distance of a cluster seed share a marker
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.195
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# MAP RENDERING
+MARKER_RENDERERS = ['auto', 'divicon', 'canvas']
+CANVAS_MARKER_THRESHOLD = 500  # Above this many markers, 'auto' draws them on a canvas
+
+# GDELT DOC API LIMITS
+GDELT_MAX_RECORDS = 50                       # maxrecords per request; a full page means truncation
+GDELT_DEFAULT_TIMESPAN = timedelta(days=90)  # Window searched when no dates are given
+GDELT_MIN_WINDOW = timedelta(minutes=15)     # GDELT's update interval; windows are not split below it
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def geohash_encode(lat, lon, precision):
+    """Encode a coordinate as a geohash string of the given length"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    bits, bit_count, even = 0, 0, True
+    chars = []
+    while len(chars) < precision:
+        value, bounds = (lon, lon_range) if even else (lat, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+class GeohashIndex:
+    """Geohash-prefix bucket index for haversine radius queries
+    
+    The geohash precision is picked so a cell is at least as tall as the query
+    radius, so a radius query only has to look at a handful of buckets.
+    """
+    
+    def __init__(self, radius_km):
+        self.radius_km = radius_km
+        self.precision = 1
+        for precision in range(12, 0, -1):
+            lat_bits = (5 * precision) // 2
+            if 180.0 / 2 ** lat_bits * KM_PER_DEGREE_LAT >= radius_km:
+                self.precision = precision
+                break
+        lat_bits = (5 * self.precision) // 2
+        self.cell_height = 180.0 / 2 ** lat_bits
+        self.cell_width = 360.0 / 2 ** (5 * self.precision - lat_bits)
+        self.buckets = defaultdict(list)
+    
+    def add(self, key, lat, lon):
+        self.buckets[geohash_encode(lat, lon, self.precision)].append((key, lat, lon))
+    
+    def query(self, lat, lon):
+        """Return the keys of all indexed points within radius_km of (lat, lon)"""
+        dlat = self.radius_km / KM_PER_DEGREE_LAT
+        dlon = min(180.0, dlat / max(math.cos(math.radians(lat)), 0.01))
+        
+        # Every cell overlapping the bounding box of the search circle
+        cells = set()
+        y = max(-90.0, lat - dlat)
+        y_end = min(90.0, lat + dlat)
+        while True:
+            x, x_end = lon - dlon, lon + dlon
+            while True:
+                cells.add(geohash_encode(y, (x + 180.0) % 360.0 - 180.0, self.precision))
+                if x >= x_end:
+                    break
+                x = min(x + self.cell_width, x_end)
+            if y >= y_end:
+                break
+            y = min(y + self.cell_height, y_end)
+        
+        return [
+            key
+            for cell in cells
+            for key, point_lat, point_lon in self.buckets.get(cell, ())
+            if haversine_km(lat, lon, point_lat, point_lon) <= self.radius_km
+        ]
+
+
+class MainTextParser(HTMLParser):
+    """Collect paragraph text from an article page, ignoring page chrome"""
+    
+    SKIP_TAGS = {'script', 'style', 'noscript', 'nav', 'header', 'footer', 'aside', 'form', 'figure'}
+    
     def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.skip_depth = 0
+        self.in_article = 0
+        self.paragraph = None
+        self.paragraphs = []
+        self.article_paragraphs = []
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag == 'article':
+            self.in_article += 1
+        elif tag == 'p' and not self.skip_depth:
+            self.paragraph = []
+    
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag == 'article':
+            self.in_article = max(0, self.in_article - 1)
+        elif tag == 'p' and self.paragraph is not None:
+            text = ' '.join(''.join(self.paragraph).split())
+            if len(text) >= 40:
+                self.paragraphs.append(text)
+                if self.in_article:
+                    self.article_paragraphs.append(text)
+            self.paragraph = None
+    
+    def handle_data(self, data):
+        if self.paragraph is not None and not self.skip_depth:
+            self.paragraph.append(data)
+    
+    def main_text(self):
+        # Prefer the <article> element when the page marks one up
+        return '\n'.join(self.article_paragraphs or self.paragraphs)
+
+
+class ArticleDownloader:
+    """Bounded concurrent article downloader with per-domain politeness and a disk cache
+    
+    Extracted main text is cached under the SHA-256 of the URL, so each URL is
+    downloaded at most once across runs. Permanent failures (other 4xx, non-HTML)
+    are cached as empty text; network errors, 5xx and ENRICH_RETRY_STATUSES
+    responses are retried next run.
+    """
+    
+    def __init__(self, cache_dir=ARTICLE_CACHE_DIR, max_workers=ENRICH_WORKERS,
+                 per_domain=ENRICH_PER_DOMAIN, domain_delay=ENRICH_DOMAIN_DELAY):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.per_domain = per_domain
+        self.domain_delay = domain_delay
+        self.lock = threading.Lock()
+        self.domain_slots = {}
+        self.domain_next_start = {}
+        self.downloaded = 0
+        self.cache_hits = 0
+    
+    def cache_path(self, url):
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + '.txt')
+    
+    def _domain_slot(self, domain):
+        with self.lock:
+            if domain not in self.domain_slots:
+                self.domain_slots[domain] = threading.Semaphore(self.per_domain)
+            return self.domain_slots[domain]
+    
+    def _wait_for_domain(self, domain):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.domain_next_start.get(domain, 0.0))
+            self.domain_next_start[domain] = start + self.domain_delay
+        if start > now:
+            time.sleep(start - now)
+    
+    def fetch_text(self, url):
+        """Return the main text of an article page ('' if unavailable), using the cache"""
+        path = self.cache_path(url)
+        if os.path.exists(path):
+            with self.lock:
+                self.cache_hits += 1
+            with open(path, 'r', encoding='utf-8') as f:
+                return f.read()
+        
+        domain = urlsplit(url).netloc.lower()
+        with self._domain_slot(domain):
+            self._wait_for_domain(domain)
+            try:
+                response = requests.get(url, timeout=15, headers={'User-Agent': ENRICH_USER_AGENT})
+            except Exception:
+                return ''
+        
+        if response.status_code >= 500 or response.status_code in ENRICH_RETRY_STATUSES:
+            return ''
+        
+        text = ''
+        if response.status_code == 200 and 'html' in response.headers.get('Content-Type', 'text/html'):
+            parser = MainTextParser()
+            try:
+                parser.feed(response.text)
+                text = parser.main_text()[:ENRICH_MAX_BODY_CHARS]
+            except Exception:
+                text = ''
+        
+        # Shards may download the same URL; each writes its own temporary file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        f, tmp_path = atomic_temp_file(path)
+        with f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.downloaded += 1
+        return text
+    
+    def fetch_all(self, urls):
+        """Fetch many URLs concurrently; returns {url: text}"""
+        urls = list(dict.fromkeys(u for u in urls if u))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(urls, executor.map(self.fetch_text, urls)))
+
+
+class Gazetteer:
+    """GeoNames places in the covered countries, in compact columns with a word-trie matcher
+    
+    Reads a GeoNames dump (allCountries.txt, a country file or citiesNNNN.txt).
+    Populated places become the 'city' tier and PPLX neighbourhoods the 'slum'
+    tier, each neighbourhood taking the largest town in its admin area as its
+    city. Place attributes live in parallel arrays; names go into a trie keyed
+    by word, so one pass over the text's words finds every multi-word name.
+    The compiled form is pickled under GAZETTEER_CACHE_DIR, keyed by the dump's
+    path, size and mtime, so later runs start without re-parsing.
+    """
+    
+    def __init__(self, path, exclude=(), min_population=GAZETTEER_MIN_POPULATION,
+                 cache_dir=GAZETTEER_CACHE_DIR):
+        stat = os.stat(path)
+        exclude = sorted(set(exclude))
+        identity = json.dumps([GAZETTEER_FORMAT, os.path.abspath(path), stat.st_size, stat.st_mtime,
+                               min_population, exclude, sorted(GAZETTEER_COUNTRIES)])
+        self.version = hashlib.sha1(identity.encode('utf-8')).hexdigest()
+        
+        cache_path = os.path.join(cache_dir, f"{self.version}.pickle")
+        try:
+            with open(cache_path, 'rb') as f:
+                self.__dict__.update(pickle.load(f))
+            return
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+        
+        started = time.time()
+        self.build(path, set(exclude), min_population)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Shards may compile at the same time; each writes its own temporary file
+        f, tmp_path = atomic_temp_file(cache_path, 'wb')
+        with f:
+            pickle.dump({name: value for name, value in self.__dict__.items() if name != 'version'},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+        print(f"🗺️  Compiled gazetteer: {len(self.names):,} places in {time.time() - started:.1f}s")
+    
+    def build(self, path, exclude, min_population):
+        self.names = []
+        self.lat = array('d')
+        self.lon = array('d')
+        self.population = array('q')
+        self.tiers = array('b')          # Index into LOCATION_TIERS
+        self.countries = []
+        self.cities = []
+        self.trie = {}
+        
+        slum_areas = []                  # (row, admin area keys) resolved to a city after the pass
+        area_towns = {}                  # admin area key -> (population, town name)
+        
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) < 15 or fields[8] not in GAZETTEER_COUNTRIES:
+                    continue
+                
+                code = fields[7]
+                population = int(fields[14] or 0)
+                if code in GAZETTEER_SLUM_CODES:
+                    tier = 'slum'
+                elif code in GAZETTEER_CITY_CODES and population >= min_population:
+                    tier = 'city'
+                else:
+                    continue
+                
+                name = fields[1]
+                areas = ((fields[8], fields[10], fields[11]), (fields[8], fields[10]))
+                if tier == 'city':
+                    for area in areas:
+                        if population > area_towns.get(area, (-1, None))[0]:
+                            area_towns[area] = (population, name)
+                
+                row = len(self.names)
+                self.names.append(name)
+                self.lat.append(float(fields[4]))
+                self.lon.append(float(fields[5]))
+                self.population.append(population)
+                self.tiers.append(LOCATION_TIERS.index(tier))
+                self.countries.append(sys.intern(GAZETTEER_COUNTRIES[fields[8]]))
+                self.cities.append(name if tier == 'city' else None)
+                if tier == 'slum':
+                    slum_areas.append((row, areas))
+                
+                for variant in {name.lower(), fields[2].lower()}:
+                    self.add_name(variant, row, tier, exclude)
+        
+        for row, areas in slum_areas:
+            town = next((area_towns[area][1] for area in areas if area in area_towns), None)
+            self.cities[row] = sys.intern(town) if town else self.names[row]
+    
+    def add_name(self, name, row, tier, exclude):
+        """Insert a lowercased name; for a name shared by several places the most populous wins"""
+        tokens = WORD_RE.findall(name)
+        if not tokens or len(name) < GAZETTEER_MIN_NAME_LENGTH or name in exclude:
+            return
+        
+        node = self.trie
+        for token in tokens:
+            node = node.setdefault(sys.intern(token), {})
+        terminal = node.setdefault('', {})
+        current = terminal.get(tier)
+        if current is None or self.population[row] > self.population[current]:
+            terminal[tier] = row
+    
+    def match(self, text_lower):
+        """Best row per tier among names in the text: most populous, then earliest"""
+        tokens = WORD_RE.findall(text_lower)
+        trie = self.trie
+        population = self.population
+        best = {}
+        
+        for start, token in enumerate(tokens):
+            node = trie.get(token)
+            position = start
+            while node is not None:
+                terminal = node.get('')
+                if terminal:
+                    for tier, row in terminal.items():
+                        current = best.get(tier)
+                        if current is None or population[row] > population[current]:
+                            best[tier] = row
+                position += 1
+                if position == len(tokens):
+                    break
+                node = node.get(tokens[position])
+        
+        return best
+    
+    def location(self, row):
+        """A location_db-style entry for a gazetteer row"""
+        return {
+            'lat': self.lat[row],
+            'lon': self.lon[row],
+            'type': LOCATION_TIERS[self.tiers[row]],
+            'city': self.cities[row],
+            'country': self.countries[row],
+        }
+
+
+class ExtractionCache:
+    """Persistent LRU memo of extraction results keyed by text hash
+    
+    The file records the version of the tables the results were computed with;
+    a cache written under another version is discarded on load.
+    """
+    
+    def __init__(self, path=EXTRACTION_CACHE_FILE, version='', max_entries=EXTRACTION_CACHE_SIZE, save_path=None):
+        self.path = path
+        self.save_path = save_path or path  # Shards save to their own file for the merge to absorb
+        self.version = version
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        
+        data = read_json(path)
+        if data and data.get('version') == version:
+            self.entries.update(data['entries'])
+    
+    def key(self, kind, text, partitions=()):
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        return f"{kind}:{','.join(partitions)}:{digest}"
+    
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+    
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def save(self):
+        """Write entries oldest first, so reloading preserves the LRU order"""
+        os.makedirs(os.path.dirname(self.save_path) or '.', exist_ok=True)
+        write_json_atomic(self.save_path, {'version': self.version, 'entries': list(self.entries.items())})
+    
+    def absorb(self, path):
+        """Fold in the entries of another cache file written under the same version; returns how many"""
+        data = read_json(path)
+        if not data or data.get('version') != self.version:
+            return 0
+        for key, value in data['entries']:
+            self.put(key, value)
+        return len(data['entries'])
+
+
+def read_json(path):
+    """Read a JSON file, returning None when it is missing or unreadable"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def atomic_temp_file(path, mode='w'):
+    """Open a uniquely named temporary file next to path, for a later os.replace onto it
+    
+    The name is unique per call, so concurrent processes writing the same path never
+    share a temporary file. Returns (open file, temporary path).
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                    prefix=os.path.basename(path) + '.', suffix='.tmp')
+    os.chmod(tmp_path, 0o644)
+    if 'b' in mode:
+        return os.fdopen(fd, mode), tmp_path
+    return os.fdopen(fd, mode, encoding='utf-8'), tmp_path
+
+
+def write_json_atomic(path, data, **dump_options):
+    """Write JSON through a temporary file so a killed run never leaves a partial file"""
+    f, tmp_path = atomic_temp_file(path)
+    try:
+        with f:
+            json.dump(data, f, ensure_ascii=False, **dump_options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def canonical_url(url):
+    """Normalize a URL for deduplication: scheme, case of the host, 'www.', trailing slash,
+    fragment and tracking parameters are ignored"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    query = '&'.join(param for param in parts.query.split('&')
+                     if param and not param.lower().startswith(TRACKING_PARAMS))
+    return f"//{host}{parts.path.rstrip('/') or '/'}" + (f"?{query}" if query else '')
+
+
+def dedup_key(url, title):
+    """Identity of an article or event: its canonical URL, or a title hash when it has no URL"""
+    if url:
+        return canonical_url(url)
+    return 'title:' + hashlib.md5(title.encode()).hexdigest()
+
+
+def iter_batches(items, size):
+    """Yield lists of up to size items from any iterable"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def intern_label(value):
+    """Intern a repeated label (country, city, source, ...) so events share one copy"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+@dataclass(slots=True)
+class Article:
+    """Compact GDELT article record; derived fields are computed on demand"""
+    title: str
+    description: str
+    url: str
+    published_at: str
+    source: str
+    language: str
+    search_query: str
+    body: str = None  # Full article text from the optional enrichment stage
+    
+    def __post_init__(self):
+        self.source = intern_label(self.source)
+        self.language = intern_label(self.language)
+        self.search_query = intern_label(self.search_query)
+    
+    @property
+    def content(self):
+        return self.description[:500]
+    
+    @property
+    def full_text(self):
+        return f"{self.title} {self.description}".lower()
+    
+    @property
+    def analysis_text(self):
+        """Text used for geocoding and classification: title, snippet and body when enriched"""
+        if self.body:
+            return f"{self.full_text} {self.body.lower()}"
+        return self.full_text
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild an article from its to_dict() form"""
+        return cls(
+            title=data.get('title', 'No title'),
+            description=data.get('description', ''),
+            url=data.get('url', ''),
+            published_at=data.get('publishedAt', ''),
+            source=data.get('source', {}).get('name', 'Unknown'),
+            language=data.get('language', 'en'),
+            search_query=data.get('search_query', 'unknown'),
+            body=data.get('body'),
+        )
+    
+    def to_dict(self):
+        """Serialize to the article JSON shape used before records were introduced"""
+        data = {
+            'title': self.title,
+            'description': self.description,
+            'content': self.content,
+            'url': self.url,
+            'publishedAt': self.published_at,
+            'source': {'name': self.source},
+            'language': self.language,
+            'full_text': self.full_text,
+            'search_query': self.search_query,
+        }
+        if self.body:
+            data['body'] = self.body
+        return data
+
+
+class SpilledArticles:
+    """Disk-backed, re-iterable sequence of articles
+    
+    The file is a JSON array with one article per line, so it loads with
+    read_json() and can also be streamed line by line.
+    """
+    
+    def __init__(self, path, count=None):
+        self.path = path
+        self.count = count
+    
+    @classmethod
+    def write(cls, path, lines):
+        """Write serialized articles (JSON strings) through a temporary file"""
+        f, tmp_path = atomic_temp_file(path)
+        count = 0
+        with f:
+            f.write('[')
+            for line in lines:
+                f.write((',\n' if count else '\n') + line)
+                count += 1
+            f.write('\n]')
+        os.replace(tmp_path, path)
+        return cls(path, count)
+    
+    @staticmethod
+    def is_line_format(path):
+        """Whether path holds one article per line (older checkpoints were a single JSON line)"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.readline().rstrip('\n') == '['
+    
+    @staticmethod
+    def line(article):
+        return json.dumps(article.to_dict(), ensure_ascii=False)
+    
+    def __len__(self):
+        if self.count is None:
+            self.count = sum(1 for _ in self.lines())
+        return self.count
+    
+    def lines(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.rstrip('\n').rstrip(',')
+                if line not in ('[', ']', '[]'):
+                    yield line
+    
+    def __iter__(self):
+        for line in self.lines():
+            yield Article.from_dict(json.loads(line))
+
+
+class ExternalArticleSort:
+    """Deduplicate articles and order them by date without holding them all in memory
+    
+    Added articles are buffered as JSON text; whenever the buffer reaches the
+    memory limit it is sorted by (canonical URL, date) and spilled to a run file.
+    finish() k-way merges the runs keeping the earliest copy of each URL, spills
+    the survivors again sorted by date, and merges those into the output file.
+    Undated articles sort last.
+    """
+    
+    def __init__(self, spill_dir, memory_limit, fan_in=EXTERNAL_MERGE_FAN_IN):
+        # Open run buffers during a merge count against the limit too
+        self.buffer_limit = memory_limit - (fan_in + 1) * SPILL_READ_BUFFER
+        if self.buffer_limit < memory_limit // 2:
+            raise ValueError(f"memory limit of {memory_limit:,} bytes is too small for a {fan_in}-way merge")
+        self.spill_dir = spill_dir
+        self.fan_in = fan_in
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.runs = []
+        self.run_counter = 0
+        self.added = 0
+        self.spilled = 0
+        shutil.rmtree(spill_dir, ignore_errors=True)
+        os.makedirs(spill_dir)
+    
+    def add(self, article):
+        self.added += 1
+        self.push((dedup_key(article.url, article.title), article.published_at or '\uffff'),
+                  SpilledArticles.line(article))
+    
+    def push(self, key, line):
+        self.buffer.append((key, line))
+        # Real string sizes: non-Latin text takes 2-4 bytes per character in memory
+        self.buffered_bytes += sys.getsizeof(line) + sum(map(sys.getsizeof, key)) + SPILL_RECORD_OVERHEAD
+        if self.buffered_bytes >= self.buffer_limit:
+            self.spill()
+    
+    def spill(self):
+        """Sort the buffer into a new run file"""
+        if not self.buffer:
+            return
+        self.buffer.sort()
+        self.runs.append(self.write_run(self.buffer))
+        self.spilled += 1
+        self.buffer = []
+        self.buffered_bytes = 0
+    
+    def write_run(self, records):
+        # Keys are JSON-encoded before a tab; JSON text never contains a raw tab
+        path = os.path.join(self.spill_dir, f"run-{self.run_counter}.tsv")
+        self.run_counter += 1
+        with open(path, 'w', encoding='utf-8') as f:
+            for key, line in records:
+                f.write(f"{json.dumps(key, ensure_ascii=False)}\t{line}\n")
+        return path
+    
+    def read_run(self, path):
+        with open(path, 'r', encoding='utf-8', buffering=SPILL_READ_BUFFER) as f:
+            for record in f:
+                key, _, line = record.rstrip('\n').partition('\t')
+                yield tuple(json.loads(key)), line
+    
+    def merged(self):
+        """Merge all runs into one sorted stream, in rounds of at most fan_in runs"""
+        self.spill()
+        runs, self.runs = self.runs, []
+        while len(runs) > self.fan_in:
+            group, runs = runs[:self.fan_in], runs[self.fan_in:]
+            runs.append(self.write_run(heapq.merge(*map(self.read_run, group))))
+            for path in group:
+                os.remove(path)
+        yield from heapq.merge(*map(self.read_run, runs))
+        for path in runs:
+            os.remove(path)
+    
+    def finish(self, output_path):
+        """Write the deduplicated, date-ordered articles and return them as SpilledArticles"""
+        previous = None
+        for (url_key, date_key), line in self.merged():
+            if url_key != previous:
+                previous = url_key
+                self.push((date_key, url_key), line)
+        
+        articles = SpilledArticles.write(output_path, (line for _, line in self.merged()))
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+        return articles
+
+
+@dataclass(slots=True)
+class Event:
+    """Compact mapped event record
+    
+    Title and description are kept whole (shared with the source Article) and
+    truncated only when serialized; full_text is derived from them unless `text`
+    holds a value that cannot be derived, e.g. after loading an event from JSON.
+    """
+    title: str
+    description: str
+    url: str
+    date: str
+    source: str
+    slum_name: str
+    city: str
+    country: str
+    lat: float
+    lon: float
+    address: str
+    location_type: str
+    event_type: str
+    affected_count: int
+    found_by_query: str
+    geocode_confidence: str = 'database'
+    text: str = None
+    
+    def __post_init__(self):
+        for name in ('source', 'slum_name', 'city', 'country', 'address',
+                     'location_type', 'event_type', 'found_by_query', 'geocode_confidence'):
+            setattr(self, name, intern_label(getattr(self, name)))
+    
+    @property
+    def full_text(self):
+        if self.text is not None:
+            return self.text
+        return f"{self.title} {self.description}".lower()
+    
+    @property
+    def event_id(self):
+        """Stable ID from the same key deduplication uses: the canonical URL, or the serialized
+        title when there is no URL (so the ID survives a to_dict/from_dict round trip)"""
+        key = dedup_key(self.url, self.title[:EVENT_TITLE_CHARS])
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    
+    @property
+    def iso_date(self):
+        if not self.date:
+            return ''  # Undated; the page shows "Unknown date"
+        if 'T' in self.date:
+            return self.date
+        return self.date + "T00:00:00Z"
+    
+    @property
+    def display_date(self):
+        if not self.date:
+            return ''
+        return self.date.split('T')[0]
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild an event from its to_dict() form"""
+        coordinates = data['coordinates']
+        return cls(
+            title=data.get('title', ''),
+            description=data.get('description', ''),
+            url=data.get('url', ''),
+            date=data.get('date', ''),
+            source=data.get('source', 'Unknown'),
+            slum_name=data.get('slum_name'),
+            city=data.get('city'),
+            country=data.get('country'),
+            lat=coordinates['lat'],
+            lon=coordinates['lon'],
+            address=coordinates.get('address', ''),
+            location_type=coordinates.get('location_type', 'unknown'),
+            event_type=data.get('event_type', 'other'),
+            affected_count=data.get('affected_count'),
+            found_by_query=data.get('found_by_query', 'unknown'),
+            geocode_confidence=data.get('geocode_confidence', 'database'),
+            text=data.get('full_text'),
+        )
+    
+    def to_dict(self, include_display_dates=False):
+        """Serialize to the event JSON shape used by slum_news_data.json and the map"""
+        data = {
+            'id': self.event_id,
+            'title': self.title[:EVENT_TITLE_CHARS],
+            'description': self.description[:200] if self.description else '',
+            'url': self.url,
+            'date': self.date,
+            'source': self.source,
+            'slum_name': self.slum_name,
+            'city': self.city,
+            'country': self.country,
+            'coordinates': {
+                'lat': self.lat,
+                'lon': self.lon,
+                'address': self.address,
+                'location_type': self.location_type
+            },
+            'event_type': self.event_type,
+            'affected_count': self.affected_count,
+            'full_text': self.full_text,
+            'geocode_confidence': self.geocode_confidence,
+            'found_by_query': self.found_by_query
+        }
+        if include_display_dates:
+            data['iso_date'] = self.iso_date
+            data['display_date'] = self.display_date
+        return data
+
+
+class RefinedSlumMapper:
+    # Page shell template and static assets, loaded once per process
+    _map_templates = None
+    
+    def __init__(self, query_stats_file=QUERY_STATS_FILE, max_requests_per_run=None,
+                 cluster_radius_km=CLUSTER_RADIUS_KM, enrich=False, article_cache_dir=ARTICLE_CACHE_DIR,
+                 run_dir=RUN_DIR, resume=False, shard_index=0, shard_count=1,
+                 canvas_marker_threshold=CANVAS_MARKER_THRESHOLD, gazetteer_path=None, sort_buffer_mb=None):
         # COMPREHENSIVE GLOBAL SOUTH DATABASE
         self.location_db = self.load_extended_database()
         
         # MULTILINGUAL SLUM KEYWORDS
         self.slum_keywords = self.load_multilingual_keywords()
         
-        # Cache for processed locations
-        self.location_cache = {}
+        # Language-partitioned matchers for event types and gazetteer names
+        self.event_keywords = self.load_event_keywords()
+        self.event_matchers = self.build_event_matchers()
+        self.location_matchers = self.build_location_matchers()
+        
+        # Optional GeoNames gazetteer, consulted after location_db within each tier
+        self.gazetteer = None
+        if gazetteer_path:
+            keywords = [k for words in self.slum_keywords.values() for k in words]
+            keywords += [k for types in self.event_keywords.values() for words in types.values() for k in words]
+            self.gazetteer = Gazetteer(gazetteer_path, exclude=(k.lower() for k in keywords))
+        
+        # Memo of extraction results, invalidated whenever the tables above change
+        self.extraction_cache = ExtractionCache(EXTRACTION_CACHE_FILE, self.tables_version(),
+                                                save_path=self.extraction_cache_path(shard_index, shard_count))
+        
+        # Per-query yield history driving the query scheduler
+        self.query_stats_file = query_stats_file
+        self.max_requests_per_run = max_requests_per_run
+        self.query_stats = self.load_query_stats()
+        
+        # Radius used to merge nearby events into one map marker
+        self.cluster_radius_km = cluster_radius_km
+        self.canvas_marker_threshold = canvas_marker_threshold
+        self.bundled_assets = {}  # Minified asset paths from the last bundle, shared by region pages
+        
+        # Optional full-article enrichment before processing
+        self.enrich = enrich
+        self.article_cache_dir = article_cache_dir
+        
+        # Query sharding across parallel workers
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        
+        # Checkpoints for restarting an interrupted run (one directory per shard)
+        self.run_dir = run_dir
+        if shard_count > 1:
+            self.run_dir = os.path.join(run_dir, f"shard-{shard_index}-of-{shard_count}")
+        self.resume = resume
+        
+        # Memory for deduplicating and sorting fetched articles; beyond it they are spilled to
+        # disk. None keeps them all in memory. Other state (events, frames, caches) is not counted.
+        self.sort_buffer = sort_buffer_mb * 1024 * 1024 if sort_buffer_mb else None
         
     def load_extended_database(self):
         """Load comprehensive database of slums, cities, and countries across Global South"""
@@ -407,89 +1390,516 @@ class RefinedSlumMapper:
         
         return unique_queries
     
-    def search_gdelt_only(self):
-        """Search GDELT with comprehensive queries"""
-        articles = []
+    def load_query_stats(self):
+        """Load per-query yield history kept from previous runs"""
+        try:
+            with open(self.query_stats_file, 'r', encoding='utf-8') as f:
+                stats = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {'run': 0, 'queries': {}}
+        
+        stats.setdefault('run', 0)
+        stats.setdefault('queries', {})
+        return stats
+    
+    def save_query_stats(self):
+        """Persist per-query yield history for the next run"""
+        write_json_atomic(self.query_stats_file, self.query_stats, indent=2, sort_keys=True)
+    
+    def schedule_queries(self, queries):
+        """Order queries by historical yield and drop low-yield queries that are not due yet
+        
+        High-yield queries run every time and first, never-seen queries run next so they
+        get a yield estimate, and low-yield queries only run once their back-off has
+        expired (most overdue first).
+        """
+        run = self.query_stats['run'] + 1
+        stats = self.query_stats['queries']
+        
+        high_yield, new, due = [], [], []
+        skipped = 0
+        for query in queries:
+            query_stats = stats.get(query)
+            if query_stats is None:
+                new.append(query)
+            elif query_stats['avg_yield'] >= HIGH_YIELD_THRESHOLD:
+                high_yield.append(query)
+            elif query_stats['next_run'] <= run:
+                due.append(query)
+            else:
+                skipped += 1
         
-        print("🔍 Searching GDELT (recent news only)...\n")
+        high_yield.sort(key=lambda q: (-stats[q]['avg_yield'], q))
+        new.sort()
+        due.sort(key=lambda q: (stats[q]['next_run'], -stats[q]['avg_yield'], q))
         
-        # Get all search queries
-        queries = self.get_all_search_queries()
+        print(f"Query schedule (run {run}):")
+        print(f"  - High-yield: {len(high_yield)}")
+        print(f"  - New: {len(new)}")
+        print(f"  - Low-yield due: {len(due)}")
+        print(f"  - Low-yield skipped: {skipped}")
         
-        print(f"Using ALL {len(queries)} search queries")
+        return high_yield + new + due
+    
+    def record_query_yields(self, query_counts, executed_queries):
+        """Fold this run's per-query article counts into the yield history
+        
+        Only queries GDELT actually answered are recorded, so network errors do not
+        count as zero-yield runs.
+        """
+        self.query_stats['run'] += 1
+        run = self.query_stats['run']
+        stats = self.query_stats['queries']
+        
+        for query in executed_queries:
+            count = query_counts.get(query, 0)
+            query_stats = stats.get(query)
+            
+            if query_stats is None:
+                query_stats = stats[query] = {'avg_yield': float(count), 'runs': 0, 'misses': 0}
+            else:
+                query_stats['avg_yield'] = round(
+                    YIELD_SMOOTHING * query_stats['avg_yield'] + (1 - YIELD_SMOOTHING) * count, 3
+                )
+            
+            query_stats['runs'] += 1
+            query_stats['last_yield'] = count
+            query_stats['last_run'] = run
+            
+            # Low-yield queries back off exponentially until they produce articles again
+            if query_stats['avg_yield'] >= HIGH_YIELD_THRESHOLD:
+                query_stats['misses'] = 0
+            else:
+                query_stats['misses'] = query_stats['misses'] + 1 if count == 0 else 0
+            query_stats['next_run'] = run + min(MAX_QUERY_INTERVAL, 2 ** query_stats['misses'])
         
-        for i, query in enumerate(queries):
+        # Shards hand their yields to the merge step instead of racing on the shared file
+        if self.shard_count <= 1:
+            self.save_query_stats()
+    
+    def prepare_run_dir(self):
+        """Create the checkpoint directory, discarding previous checkpoints unless resuming an unfinished run
+        
+        Checkpoints of a run that started more than RESUME_MAX_AGE ago are discarded too,
+        so a scheduled run never reuses an earlier day's search results as current.
+        """
+        finished = os.path.exists(os.path.join(self.run_dir, RUN_COMPLETE_FILE))
+        started = (read_json(os.path.join(self.run_dir, RUN_STARTED_FILE)) or {}).get('started_at')
+        stale = started is None or datetime.now(timezone.utc) - datetime.fromisoformat(started) > RESUME_MAX_AGE
+        if self.resume and finished:
+            print("ℹ️  The last run finished; nothing to resume, starting a fresh run")
+        elif self.resume and stale and os.path.isdir(self.run_dir):
+            print(f"ℹ️  The interrupted run's checkpoints are older than {RESUME_MAX_AGE.total_seconds() / 3600:g} hours; "
+                  "starting a fresh run")
+        
+        if (not self.resume or finished or stale) and os.path.isdir(self.run_dir):
+            shutil.rmtree(self.run_dir)
+        os.makedirs(os.path.join(self.run_dir, 'queries'), exist_ok=True)
+        os.makedirs(os.path.join(self.run_dir, 'events'), exist_ok=True)
+        if not os.path.exists(os.path.join(self.run_dir, RUN_STARTED_FILE)):
+            write_json_atomic(os.path.join(self.run_dir, RUN_STARTED_FILE),
+                              {'started_at': datetime.now(timezone.utc).isoformat()})
+    
+    def mark_run_complete(self):
+        """Record that this run's checkpoints are no longer needed for a resume"""
+        if os.path.isdir(self.run_dir):
+            write_json_atomic(os.path.join(self.run_dir, RUN_COMPLETE_FILE),
+                              {'finished_at': datetime.now(timezone.utc).isoformat()})
+    
+    def tables_version(self):
+        """Hash of the gazetteer, keyword and pattern tables; changes whenever extraction results may change
+        
+        Besides the tables themselves this covers the event type priority, the tier order,
+        the language partitioning and the affected-count patterns.
+        """
+        tables = [self.location_db, self.slum_keywords, self.event_keywords,
+                  self.gazetteer.version if self.gazetteer else None,
+                  EVENT_TYPES, LOCATION_TIERS, GDELT_LANGUAGES, SHARED_PARTITION,
+                  AFFECTED_COUNT_PATTERNS, AFFECTED_COUNT_WORDS]
+        return hashlib.sha256(json.dumps(tables, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    
+    def stage_path(self, name):
+        return os.path.join(STAGE_DIR, name)
+    
+    def save_articles_artifact(self, articles):
+        """Write the fetch stage output, streaming it so articles may be SpilledArticles"""
+        os.makedirs(STAGE_DIR, exist_ok=True)
+        saved = SpilledArticles.write(self.stage_path('articles.json'), map(SpilledArticles.line, articles))
+        print(f"\n💾 Articles saved: {self.stage_path('articles.json')}")
+        return saved
+    
+    def load_articles_artifact(self):
+        """Load the fetched articles; with a sort buffer they are streamed from disk"""
+        if self.sort_buffer is not None:
+            path = self.stage_path('articles.json')
+            return SpilledArticles(path) if os.path.exists(path) else None
+        data = read_json(self.stage_path('articles.json'))
+        if data is None:
+            return None
+        return [Article.from_dict(item) for item in data]
+    
+    def process_inputs(self):
+        """Identify the process stage inputs: the fetched articles file and the extraction tables"""
+        digest = hashlib.sha256()
+        with open(self.stage_path('articles.json'), 'rb') as f:
+            for chunk in iter(lambda: f.read(SPILL_READ_BUFFER), b''):
+                digest.update(chunk)
+        return {'articles': digest.hexdigest(), 'tables': self.tables_version()}
+    
+    def save_events_artifact(self, events):
+        """Write the process stage output along with the inputs it was computed from"""
+        os.makedirs(STAGE_DIR, exist_ok=True)
+        write_json_atomic(self.stage_path('events.json'), {
+            'inputs': self.process_inputs(),
+            'events': [event.to_dict() for event in events]
+        })
+        print(f"💾 Events saved: {self.stage_path('events.json')}")
+    
+    def load_events_artifact(self, require_current=False):
+        """Load processed events; with require_current, only if their inputs are unchanged"""
+        data = read_json(self.stage_path('events.json'))
+        if data is None:
+            return None
+        if require_current and data.get('inputs') != self.process_inputs():
+            return None
+        return [Event.from_dict(item) for item in data['events']]
+    
+    def load_run_checkpoint(self, name):
+        """Load a whole-stage checkpoint from the run directory, if resuming"""
+        if not self.resume:
+            return None
+        return read_json(os.path.join(self.run_dir, name))
+    
+    def save_run_checkpoint(self, name, data):
+        if os.path.isdir(self.run_dir):
+            write_json_atomic(os.path.join(self.run_dir, name), data)
+    
+    def query_checkpoint_path(self, query):
+        digest = hashlib.sha1(query.encode('utf-8')).hexdigest()
+        return os.path.join(self.run_dir, 'queries', f"{digest}.json")
+    
+    def load_query_checkpoint(self, query):
+        """Return (raw articles, requests made) for a query finished by an earlier attempt, if resuming"""
+        if not self.resume:
+            return None
+        checkpoint = read_json(self.query_checkpoint_path(query))
+        if checkpoint is None or checkpoint.get('query') != query:
+            return None
+        return checkpoint['articles'], checkpoint['requests']
+    
+    def save_query_checkpoint(self, query, gdelt_articles, requests_made):
+        if not os.path.isdir(os.path.join(self.run_dir, 'queries')):
+            return
+        write_json_atomic(self.query_checkpoint_path(query), {
+            'query': query,
+            'requests': requests_made,
+            'articles': gdelt_articles
+        })
+    
+    def event_checkpoint_path(self, batch_index):
+        return os.path.join(self.run_dir, 'events', f"batch-{batch_index:05d}.json")
+    
+    def article_batch_digest(self, batch):
+        """Fingerprint of a batch of articles, so a checkpoint is only reused for the same input"""
+        digest = hashlib.sha1()
+        for article in batch:
+            digest.update((article.url or article.title).encode('utf-8') + b'\n')
+        return digest.hexdigest()
+    
+    def load_event_checkpoint(self, batch_index, batch):
+        """Return the events of an already processed batch of articles, if resuming"""
+        if not self.resume:
+            return None
+        checkpoint = read_json(self.event_checkpoint_path(batch_index))
+        if checkpoint is None or checkpoint.get('articles_digest') != self.article_batch_digest(batch):
+            return None
+        return [Event.from_dict(data) for data in checkpoint['events']]
+    
+    def save_event_checkpoint(self, batch_index, batch, batch_events):
+        if not os.path.isdir(os.path.join(self.run_dir, 'events')):
+            return
+        write_json_atomic(self.event_checkpoint_path(batch_index), {
+            'articles_digest': self.article_batch_digest(batch),
+            'events': [event.to_dict() for event in batch_events]
+        })
+    
+    def fetch_gdelt_window(self, query, start=None, end=None):
+        """Run one GDELT artlist request, optionally restricted to a time window
+        
+        Returns the raw GDELT article dicts, or None when GDELT did not answer.
+        """
+        url = "https://api.gdeltproject.org/api/v2/doc/doc"
+        params = {
+            'query': f'"{query}"',  # Exact phrase search
+            'mode': 'artlist',
+            'format': 'json',
+            'maxrecords': GDELT_MAX_RECORDS,
+            'sort': 'datedesc'
+        }
+        if start and end:
+            params['startdatetime'] = start.strftime('%Y%m%d%H%M%S')
+            params['enddatetime'] = end.strftime('%Y%m%d%H%M%S')
+        
+        try:
+            response = requests.get(url, params=params, timeout=20)
+            time.sleep(0.2)  # Reduced rate limiting for more queries
+            
+            if response.status_code != 200:
+                return None
+            
+            # Empty responses and JSON decode errors mean no articles
+            if not response.text or response.text.strip() == "":
+                return []
             try:
-                if i % 20 == 0:
-                    print(f"   [{i+1}/{len(queries)}] Processing queries...")
-                
-                url = "https://api.gdeltproject.org/api/v2/doc/doc"
-                params = {
-                    'query': f'"{query}"',  # Exact phrase search
-                    'mode': 'artlist',
-                    'format': 'json',
-                    'maxrecords': 50,
-                    # REMOVE date restrictions to get more data
-                    'sort': 'datedesc'
-                }
-                
-                response = requests.get(url, params=params, timeout=20)
-                
-                if response.status_code == 200:
-                    # Check if response has content
-                    if not response.text or response.text.strip() == "":
-                        # Skip empty responses
-                        continue
-                    
-                    try:
-                        data = response.json()
-                    except json.JSONDecodeError:
-                        # Skip JSON decode errors silently
-                        continue
-                    
-                    if 'articles' in data:
-                        for article in data['articles']:
-                            seendate = article.get('seendate', '')
-                            published_at = self.parse_gdelt_date(seendate)
-                            
-                            # Create article entry
-                            articles.append({
-                                'title': article.get('title', 'No title'),
-                                'description': article.get('snippet', ''),
-                                'content': article.get('snippet', '')[:500],
-                                'url': article.get('url', ''),
-                                'publishedAt': published_at,
-                                'source': {'name': article.get('domain', 'Unknown')},
-                                'language': article.get('language', 'en'),
-                                'full_text': f"{article.get('title', '')} {article.get('snippet', '')}".lower(),
-                                'search_query': query
-                            })
+                data = response.json()
+            except json.JSONDecodeError:
+                return []
+            
+            return data.get('articles', [])
+            
+        except Exception as e:
+            error_msg = str(e)
+            if "JSON" not in error_msg and "Expecting value" not in error_msg:
+                print(f"     Error for query '{query}': {error_msg[:50]}")
+            return None
+    
+    def fetch_query_articles(self, query, max_requests=None):
+        """Fetch every article for a query, splitting saturated time windows
+        
+        A response holding exactly GDELT_MAX_RECORDS articles is assumed to be
+        truncated, so its time range is halved and both halves are fetched one
+        request at a time (paced like every other request), until every window
+        comes back below the cap (or reaches GDELT_MIN_WINDOW).
+        
+        The query only counts as answered when every window was fetched: a failed
+        window or running out of max_requests (the remaining run budget) makes
+        the whole query unanswered, so it is neither checkpointed nor recorded.
+        
+        Returns (raw articles, number of requests made, whether GDELT answered).
+        """
+        gdelt_articles = self.fetch_gdelt_window(query)
+        if gdelt_articles is None:
+            return [], 1, False
+        
+        collected = list(gdelt_articles)
+        requests_made = 1
+        
+        if len(gdelt_articles) >= GDELT_MAX_RECORDS:
+            end = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+            pending = deque(self.split_window(end - GDELT_DEFAULT_TIMESPAN, end))
+            splits = 1
+            
+            while pending:
+                if max_requests is not None and requests_made >= max_requests:
+                    print(f"     '{query}' needs more requests than the budget allows; will retry next run")
+                    return [], requests_made, False
                 
-                time.sleep(0.2)  # Reduced rate limiting for more queries
+                window = pending.popleft()
+                window_articles = self.fetch_gdelt_window(query, *window)
+                requests_made += 1
+                if window_articles is None:
+                    print(f"     '{query}': a split window got no answer; will retry next run")
+                    return [], requests_made, False
                 
-            except Exception as e:
-                error_msg = str(e)
-                if "JSON" in error_msg or "Expecting value" in error_msg:
-                    # Skip JSON decode errors silently
-                    continue
-                else:
-                    print(f"     Error for query '{query}': {str(e)[:50]}")
-                    continue
+                collected.extend(window_articles)
+                if len(window_articles) >= GDELT_MAX_RECORDS and window[1] - window[0] >= GDELT_MIN_WINDOW * 2:
+                    pending.extend(self.split_window(*window))
+                    splits += 1
+            
+            print(f"     '{query}' saturated maxrecords: split into {splits + 1} windows")
         
-        # Remove duplicates by URL
+        # Windows overlap the first (unbounded) response, so dedup within the query
         seen_urls = set()
-        unique_articles = []
-        
-        for article in articles:
+        unique = []
+        for article in collected:
             url = article.get('url', '')
-            if url and url not in seen_urls:
+            if url in seen_urls:
+                continue
+            if url:
                 seen_urls.add(url)
-                unique_articles.append(article)
-            elif not url:  # If no URL, use title hash
-                title_hash = hashlib.md5(article['title'].encode()).hexdigest()
-                if title_hash not in seen_urls:
-                    seen_urls.add(title_hash)
-                    unique_articles.append(article)
+            unique.append(article)
+        
+        return unique, requests_made, True
+    
+    def split_window(self, window_start, window_end):
+        middle = window_start + (window_end - window_start) / 2
+        return [(window_start, middle), (middle, window_end)]
+    
+    def deduplicate(self, records):
+        """Drop repeated articles/events by canonical URL (title hash when there is no URL), keeping the first"""
+        seen_keys = set()
+        unique = []
+        
+        for record in records:
+            key = dedup_key(record.url, record.title)
+            if key not in seen_keys:
+                seen_keys.add(key)
+                unique.append(record)
+        
+        return unique
+    
+    def shard_queries(self, queries):
+        """Select this shard's deterministic subset of queries (by SHA-1 of the query)"""
+        if self.shard_count <= 1:
+            return queries
+        return [
+            query for query in queries
+            if int(hashlib.sha1(query.encode('utf-8')).hexdigest(), 16) % self.shard_count == self.shard_index
+        ]
+    
+    def extraction_cache_path(self, shard_index, shard_count):
+        """Where a process saves its extraction memo: the shared file, or a per-shard one"""
+        if shard_count <= 1:
+            return EXTRACTION_CACHE_FILE
+        stem, ext = os.path.splitext(EXTRACTION_CACHE_FILE)
+        return f"{stem}-shard-{shard_index}-of-{shard_count}{ext}"
+    
+    def shard_output_path(self):
+        return os.path.join(SHARD_DIR, f"shard-{self.shard_index}-of-{self.shard_count}.json")
+    
+    def write_shard(self, articles, events):
+        """Write this shard's partial articles, events and query yields for a later merge"""
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        shard_queries = set(self.shard_queries(self.get_all_search_queries()))
+        path = self.shard_output_path()
+        write_json_atomic(path, {
+            'shard_index': self.shard_index,
+            'shard_count': self.shard_count,
+            'articles': [article.to_dict() for article in articles],
+            'events': [event.to_dict() for event in events],
+            'query_stats': {
+                'run': self.query_stats['run'],
+                'queries': {q: s for q, s in self.query_stats['queries'].items() if q in shard_queries}
+            }
+        })
+        print(f"\n✅ Shard {self.shard_index + 1}/{self.shard_count} saved: {path}")
+        return path
+    
+    def merge_shards(self, shard_files):
+        """Combine shard outputs: deduplicate articles and events, and fold in query yields and extraction memos"""
+        articles, events = [], []
+        memo_paths = []
+        
+        print(f"\n🧩 Merging {len(shard_files)} shards...")
+        for shard_file in sorted(shard_files):
+            shard = read_json(shard_file)
+            if shard is None:
+                print(f"   ⚠️ Skipping unreadable shard: {shard_file}")
+                continue
+            
+            articles.extend(Article.from_dict(data) for data in shard['articles'])
+            events.extend(Event.from_dict(data) for data in shard['events'])
+            
+            shard_stats = shard.get('query_stats', {})
+            self.query_stats['queries'].update(shard_stats.get('queries', {}))
+            self.query_stats['run'] = max(self.query_stats['run'], shard_stats.get('run', 0))
+            
+            # Shards save their extraction memo separately; fold it into the shared one
+            memo_path = self.extraction_cache_path(shard.get('shard_index', 0), shard.get('shard_count', 1))
+            if memo_path != EXTRACTION_CACHE_FILE and self.extraction_cache.absorb(memo_path):
+                memo_paths.append(memo_path)
+            print(f"   {shard_file}: {len(shard['articles'])} articles, {len(shard['events'])} events")
+        
+        self.save_query_stats()
+        self.extraction_cache.save()
+        for memo_path in memo_paths:
+            os.remove(memo_path)
+        
+        articles = self.deduplicate(articles)
+        events = self.deduplicate(events)
+        self.events_df = self.build_events_frame(events)
+        
+        print(f"   Merged: {len(articles)} unique articles, {len(events)} unique events")
+        return articles, events
+    
+    def search_gdelt_only(self):
+        """Search GDELT with comprehensive queries
+        
+        Under a memory limit, articles are deduplicated and date-ordered by an
+        ExternalArticleSort and returned as SpilledArticles instead of a list.
+        """
+        articles = []
+        sorter = None
+        
+        print("🔍 Searching GDELT (recent news only)...\n")
+        
+        # A resumed run whose search already finished goes straight to its articles
+        checkpoint_path = os.path.join(self.run_dir, 'articles.json')
+        if self.sort_buffer is not None:
+            if self.resume and os.path.exists(checkpoint_path) and SpilledArticles.is_line_format(checkpoint_path):
+                articles = SpilledArticles(checkpoint_path)
+                print(f"♻️  Resumed {len(articles)} articles from the finished search checkpoint")
+                return articles
+            sorter = ExternalArticleSort(os.path.join(self.run_dir, SPILL_DIR), self.sort_buffer)
+            print(f"Sort buffer: {self.sort_buffer // (1024 * 1024)} MB (external dedup and sort)")
+        else:
+            checkpoint = self.load_run_checkpoint('articles.json')
+            if checkpoint is not None:
+                print(f"♻️  Resumed {len(checkpoint)} articles from the finished search checkpoint")
+                return [Article.from_dict(data) for data in checkpoint]
+        
+        # Get this shard's search queries, ordered by historical yield (kept fixed across resumes)
+        queries = self.load_run_checkpoint('schedule.json')
+        if queries is None:
+            queries = self.schedule_queries(self.shard_queries(self.get_all_search_queries()))
+            self.save_run_checkpoint('schedule.json', queries)
+        
+        print(f"Using {len(queries)} search queries")
+        if self.max_requests_per_run is not None:
+            print(f"Request budget: {self.max_requests_per_run} requests")
+        
+        # Articles returned per query, before deduplication
+        query_counts = Counter()
+        answered_queries = []
+        requests_made = 0
+        resumed_queries = 0
+        
+        for i, query in enumerate(queries):
+            if self.max_requests_per_run is not None and requests_made >= self.max_requests_per_run:
+                print(f"   Request budget reached after {i} of {len(queries)} queries")
+                break
+            
+            if i % 20 == 0:
+                print(f"   [{i+1}/{len(queries)}] Processing queries...")
+            
+            checkpoint = self.load_query_checkpoint(query)
+            if checkpoint is not None:
+                gdelt_articles, query_requests = checkpoint
+                requests_made += query_requests
+                resumed_queries += 1
+            else:
+                remaining = None if self.max_requests_per_run is None else self.max_requests_per_run - requests_made
+                gdelt_articles, query_requests, answered = self.fetch_query_articles(query, remaining)
+                requests_made += query_requests
+                if not answered:
+                    continue
+                self.save_query_checkpoint(query, gdelt_articles, query_requests)
+            
+            answered_queries.append(query)
+            query_counts[query] += len(gdelt_articles)
+            
+            for article in gdelt_articles:
+                (sorter.add if sorter else articles.append)(Article(
+                    title=article.get('title', 'No title'),
+                    description=article.get('snippet', ''),
+                    url=article.get('url', ''),
+                    published_at=self.parse_gdelt_date(article.get('seendate', '')),
+                    source=article.get('domain', 'Unknown'),
+                    language=article.get('language', 'en'),
+                    search_query=query
+                ))
+        
+        if resumed_queries:
+            print(f"   ♻️  Resumed {resumed_queries} queries from checkpoints")
+        
+        self.record_query_yields(query_counts, answered_queries)
+        
+        # Remove duplicates by URL
+        if sorter:
+            unique_articles = sorter.finish(checkpoint_path)
+            print(f"\n🧮 External sort: {sorter.added} articles spilled in {sorter.spilled} sorted runs")
+        else:
+            unique_articles = self.deduplicate(articles)
         
         print(f"\n📰 Found {len(unique_articles)} unique articles from GDELT")
         
@@ -497,19 +1907,23 @@ class RefinedSlumMapper:
         if unique_articles:
             query_counts = {}
             for article in unique_articles:
-                query = article.get('search_query', 'unknown')
+                query = article.search_query
                 query_counts[query] = query_counts.get(query, 0) + 1
             
             print("\n📊 Top 15 most successful queries:")
             for query, count in sorted(query_counts.items(), key=lambda x: x[1], reverse=True)[:15]:
                 print(f"   '{query}': {count} articles")
         
+        # Same one-article-per-line format as the sorter's output, so either mode can resume it
+        if not sorter and os.path.isdir(self.run_dir):
+            SpilledArticles.write(checkpoint_path, map(SpilledArticles.line, unique_articles))
+        
         return unique_articles
     
     def parse_gdelt_date(self, seendate):
-        """Parse GDELT date format to ISO 8601"""
+        """Parse GDELT date format to ISO 8601 ('' when missing, so output never depends on the clock)"""
         if not seendate or len(seendate) < 8:
-            return datetime.now().isoformat() + "Z"
+            return ''
         
         try:
             # Format: YYYYMMDDHHMMSS
@@ -532,206 +1946,329 @@ class RefinedSlumMapper:
             return dt.isoformat() + "Z"
             
         except:
-            return datetime.now().isoformat() + "Z"
+            return ''
+    
+    def load_event_keywords(self):
+        """Load event keywords partitioned by article language
+        
+        The 'shared' partition holds language-neutral terms and is checked for
+        every article regardless of its language.
+        """
+        return {
+            'en': {
+                'eviction': ['eviction', 'evictions', 'forced eviction', 'forced removal', 'expulsion'],
+                'demolition': ['demolition', 'demolitions', 'bulldoze', 'bulldozing', 'razed', 'torn down'],
+                'protest': ['protest', 'protests', 'demonstration', 'march', 'rally', 'strike'],
+                'fire': ['fire', 'blaze', 'arson', 'burning', 'incendiary', 'inferno'],
+                'flood': ['flood', 'flooding', 'inundation', 'deluge'],
+                'land_rights': ['land rights', 'land conflict', 'land dispute', 'land grab', 'eviction'],
+                'disease': ['cholera', 'malaria', 'disease', 'outbreak', 'epidemic', 'health crisis'],
+                'development': ['development', 'redevelopment', 'urban renewal', 'regeneration']
+            },
+            'pt': {
+                'eviction': ['despejo', 'despejos', 'remoção forçada', 'expulsão'],
+                'demolition': ['demolição', 'demolições'],
+                'protest': ['protesto', 'protestos', 'manifestação', 'greve'],
+                'fire': ['incêndio', 'queimada'],
+                'flood': ['enchente', 'inundação'],
+                'land_rights': ['direito à terra', 'conflito fundiário', 'disputa de terra'],
+                'disease': ['cólera', 'malária', 'doença', 'surto'],
+                'development': ['desenvolvimento', 'renovação urbana']
+            },
+            'es': {
+                'eviction': ['desalojo', 'desalojos', 'desahucio'],
+                'demolition': ['demolición', 'demoliciones'],
+                'protest': ['protesta', 'protestas', 'manifestación', 'huelga'],
+                'fire': ['incendio', 'quema'],
+                'flood': ['inundación'],
+                'land_rights': ['derecho a la tierra', 'conflicto de tierras'],
+                'disease': ['cólera', 'malaria', 'enfermedad', 'brote'],
+                'development': ['desarrollo', 'renovación urbana']
+            },
+            'fr': {
+                'eviction': ['expulsion', 'expulsions'],
+                'demolition': ['démolition', 'démolitions'],
+                'protest': ['protestation', 'manifestation', 'grève'],
+                'fire': ['incendie', 'feu'],
+                'flood': ['inondation', 'déluge'],
+                'land_rights': ['droit foncier', 'conflit foncier'],
+                'disease': ['choléra', 'paludisme', 'maladie', 'épidémie'],
+                'development': ['développement', 'rénovation urbaine']
+            },
+            SHARED_PARTITION: {}
+        }
+    
+    def build_event_matchers(self):
+        """Group event keywords into per-partition (event type, keywords) lists in priority order"""
+        matchers = {}
+        for partition, keywords_by_type in self.event_keywords.items():
+            matchers[partition] = [
+                (priority, event_type, tuple(dict.fromkeys(keywords_by_type[event_type])))
+                for priority, event_type in enumerate(EVENT_TYPES) if keywords_by_type.get(event_type)
+            ]
+        return matchers
     
-    def extract_location_from_text(self, text):
-        """Extract location from text using database only"""
+    def build_location_matchers(self):
+        """Compile one pattern per (language partition, location tier) over the gazetteer
+        
+        Place names are proper nouns and go to the shared partition unless an entry
+        carries a 'lang' code. Each pattern finds every whole-word name in one pass;
+        the earliest database entry among the hits wins, as in a sequential scan.
+        """
+        partitions = defaultdict(lambda: {tier: {} for tier in LOCATION_TIERS})
+        for order, (location_name, location_data) in enumerate(self.location_db.items()):
+            tier = location_data.get('type')
+            if tier in LOCATION_TIERS:
+                names = partitions[location_data.get('lang', SHARED_PARTITION)][tier]
+                names.setdefault(location_name.lower(), (order, location_name, location_data))
+        
+        matchers = {}
+        for partition, tiers in partitions.items():
+            matchers[partition] = {}
+            for tier, names in tiers.items():
+                if names:
+                    alternation = '|'.join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+                    matchers[partition][tier] = (re.compile(r'(?=\b(' + alternation + r')\b)'), names)
+        return matchers
+    
+    def language_partitions(self, language):
+        """Matcher partitions to scan for an article language (all of them if unknown)"""
+        if language:
+            language = language.lower()
+            code = GDELT_LANGUAGES.get(language, language)
+            if code in self.event_keywords and code != SHARED_PARTITION:
+                return [code, SHARED_PARTITION]
+        return list(self.event_keywords)
+    
+    def extract_location_from_text(self, text, language=None):
+        """Extract location from text using database only (memoized)"""
         if not text:
             return None, None, None, None
         
         text_lower = text.lower()
+        partitions = self.language_partitions(language)
         
-        # Priority 1: Look for known slums (exact match)
-        for location_name, location_data in self.location_db.items():
-            if location_data.get('type') == 'slum':
-                # Check for exact match or as a separate word
-                pattern = r'\b' + re.escape(location_name.lower()) + r'\b'
-                if re.search(pattern, text_lower):
-                    return location_name, location_data['city'], location_data['country'], location_data
+        key = self.extraction_cache.key('location', text_lower, partitions)
+        cached = self.extraction_cache.get(key)
+        if cached is None:
+            slum_name, city, country, location_key = self.scan_location(text_lower, partitions)
+            cached = [slum_name, city, country, location_key]
+            self.extraction_cache.put(key, cached)
         
-        # Priority 2: Look for cities
-        for location_name, location_data in self.location_db.items():
-            if location_data.get('type') == 'city':
-                pattern = r'\b' + re.escape(location_name.lower()) + r'\b'
-                if re.search(pattern, text_lower):
-                    return None, location_name, location_data['country'], location_data
-        
-        # Priority 3: Look for countries
-        for location_name, location_data in self.location_db.items():
-            if location_data.get('type') == 'country':
-                pattern = r'\b' + re.escape(location_name.lower()) + r'\b'
-                if re.search(pattern, text_lower):
-                    return None, location_data['city'], location_name, location_data
+        slum_name, city, country, location_key = cached
+        if location_key is None:
+            return None, None, None, None
+        if location_key.startswith(GEONAMES_KEY_PREFIX):
+            return slum_name, city, country, self.gazetteer.location(int(location_key[len(GEONAMES_KEY_PREFIX):]))
+        return slum_name, city, country, self.location_db[location_key]
+    
+    def scan_location(self, text_lower, partitions):
+        """Match location_db, then the GeoNames gazetteer, tier by tier
+        
+        Returns (slum, city, country, location key); gazetteer places have
+        GEONAMES_KEY_PREFIX keys.
+        """
+        gazetteer_hits = None
+        # Slums first, then cities, then countries (final fallback)
+        for tier in LOCATION_TIERS:
+            best = None
+            for partition in partitions:
+                matcher = self.location_matchers.get(partition, {}).get(tier)
+                if not matcher:
+                    continue
+                pattern, names = matcher
+                for match in pattern.finditer(text_lower):
+                    candidate = names[match.group(1)]
+                    if best is None or candidate[0] < best[0]:
+                        best = candidate
+            
+            if best:
+                _, location_name, location_data = best
+                if tier == 'slum':
+                    return location_name, location_data['city'], location_data['country'], location_name
+                if tier == 'city':
+                    return None, location_name, location_data['country'], location_name
+                return None, location_data['city'], location_name, location_name
+            
+            if self.gazetteer is not None and tier != 'country':
+                if gazetteer_hits is None:
+                    gazetteer_hits = self.gazetteer.match(text_lower)
+                row = gazetteer_hits.get(tier)
+                if row is not None:
+                    key = f"{GEONAMES_KEY_PREFIX}{row}"
+                    location_data = self.gazetteer.location(row)
+                    name = self.gazetteer.names[row].lower()
+                    if tier == 'slum':
+                        return name, location_data['city'], location_data['country'], key
+                    return None, name, location_data['country'], key
         
         return None, None, None, None
     
-    def extract_event_type(self, text):
-        """Extract event type from text"""
+    def extract_event_type(self, text, language=None):
+        """Extract event type from text, scanning only the article language's keywords (memoized)"""
         if not text:
             return 'other'
         
         text_lower = text.lower()
-        
-        # Event keywords in multiple languages
-        event_keywords = {
-            'eviction': [
-                'eviction', 'evictions', 'forced eviction', 'forced removal', 'expulsion',
-                'despejo', 'despejos', 'remoção forçada', 'expulsão',  # Portuguese
-                'desalojo', 'desalojos', 'desahucio',  # Spanish
-                'expulsion', 'expulsions'  # French
-            ],
-            'demolition': [
-                'demolition', 'demolitions', 'bulldoze', 'bulldozing', 'razed', 'torn down',
-                'demolição', 'demolições',  # Portuguese
-                'demolición', 'demoliciones',  # Spanish
-                'démolition', 'démolitions'  # French
-            ],
-            'protest': [
-                'protest', 'protests', 'demonstration', 'march', 'rally', 'strike',
-                'protesto', 'protestos', 'manifestação', 'greve',  # Portuguese
-                'protesta', 'protestas', 'manifestación', 'huelga',  # Spanish
-                'protestation', 'manifestation', 'grève'  # French
-            ],
-            'fire': [
-                'fire', 'blaze', 'arson', 'burning', 'incendiary', 'inferno',
-                'incêndio', 'queimada',  # Portuguese
-                'incendio', 'quema',  # Spanish
-                'incendie', 'feu'  # French
-            ],
-            'flood': [
-                'flood', 'flooding', 'inundation', 'deluge',
-                'enchente', 'inundação',  # Portuguese
-                'inundación',  # Spanish
-                'inondation', 'déluge'  # French
-            ],
-            'land_rights': [
-                'land rights', 'land conflict', 'land dispute', 'land grab', 'eviction',
-                'direito à terra', 'conflito fundiário', 'disputa de terra',  # Portuguese
-                'derecho a la tierra', 'conflicto de tierras',  # Spanish
-                'droit foncier', 'conflit foncier'  # French
-            ],
-            'disease': [
-                'cholera', 'malaria', 'disease', 'outbreak', 'epidemic', 'health crisis',
-                'cólera', 'malária', 'doença', 'surto',  # Portuguese
-                'cólera', 'malaria', 'enfermedad', 'brote',  # Spanish
-                'choléra', 'paludisme', 'maladie', 'épidémie'  # French
-            ],
-            'development': [
-                'development', 'redevelopment', 'urban renewal', 'regeneration',
-                'desenvolvimento', 'renovação urbana',  # Portuguese
-                'desarrollo', 'renovación urbana',  # Spanish
-                'développement', 'rénovation urbaine'  # French
-            ]
-        }
-        
-        for event_type, keywords in event_keywords.items():
-            for keyword in keywords:
-                if keyword in text_lower:
-                    return event_type
-        
-        return 'other'
+        partitions = self.language_partitions(language)
+        
+        key = self.extraction_cache.key('event_type', text_lower, partitions)
+        event_type = self.extraction_cache.get(key)
+        if event_type is None:
+            event_type = self.scan_event_type(text_lower, partitions)
+            self.extraction_cache.put(key, event_type)
+        return event_type
+    
+    def scan_event_type(self, text_lower, partitions):
+        """Earliest event type in priority order with a keyword in any of the partitions"""
+        best = len(EVENT_TYPES)
+        for partition in partitions:
+            for priority, event_type, keywords in self.event_matchers[partition]:
+                if priority >= best:
+                    break
+                if any(keyword in text_lower for keyword in keywords):
+                    best = priority
+                    break
+        
+        return EVENT_TYPES[best] if best < len(EVENT_TYPES) else 'other'
     
     def extract_affected_count(self, text):
-        """Extract number of people mentioned"""
+        """Extract number of people mentioned (memoized)"""
         if not text:
             return None
-            
-        patterns = [
-            r'(\d+,?\d*)\s+(families|households|people|residents|persons|individuals)',
-            r'(hundreds|thousands|millions)\s+(?:of\s+)?(families|households|people|residents)',
-            r'(\d+,?\d*)\s+were\s+(evicted|displaced|affected|homeless)',
-            r'over\s+(\d+,?\d*)\s+people',
-            r'more than\s+(\d+,?\d*)\s+people',
-            r'(\d+,?\d*)\s+to\s+(\d+,?\d*)\s+people',
-            r'(\d+)\s+(evacuated|relocated|moved)'
-        ]
         
-        for pattern in patterns:
-            match = re.search(pattern, text.lower())
+        text_lower = text.lower()
+        key = self.extraction_cache.key('affected_count', text_lower)
+        cached = self.extraction_cache.get(key)
+        if cached is None:
+            cached = [self.scan_affected_count(text_lower)]  # Wrapped so a cached None is not a miss
+            self.extraction_cache.put(key, cached)
+        return cached[0]
+    
+    def scan_affected_count(self, text_lower):
+        for pattern in AFFECTED_COUNT_PATTERNS:
+            match = re.search(pattern, text_lower)
             if match:
                 num_str = match.group(1)
                 if num_str.replace(',', '').isdigit():
                     return int(num_str.replace(',', ''))
-                elif num_str == 'hundreds':
-                    return 300
-                elif num_str == 'thousands':
-                    return 2000
-                elif num_str == 'millions':
-                    return 100000
+                elif num_str in AFFECTED_COUNT_WORDS:
+                    return AFFECTED_COUNT_WORDS[num_str]
         
         return None
     
+    def needs_body(self, article):
+        """Whether the snippet geocodes, but only to a country or without a specific event type
+        
+        Articles the snippet cannot place would not map anyway, and ones already placed
+        in a city or slum with a known event type gain little from their body.
+        """
+        slum_name, city, country, location_data = self.extract_location_from_text(article.full_text, article.language)
+        if not location_data:
+            return False
+        return not (slum_name or city) or self.extract_event_type(article.full_text, article.language) == 'other'
+    
+    def enrich_articles(self, articles):
+        """Download bodies of the geocoded candidates whose snippet result is imprecise (see needs_body)"""
+        downloader = ArticleDownloader(cache_dir=self.article_cache_dir)
+        
+        candidates = [article for article in articles if self.needs_body(article)]
+        print(f"\n📥 Enriching {len(candidates)} of {len(articles)} articles with full text "
+              f"(geocoded only to a country or of type 'other')...")
+        texts = downloader.fetch_all(article.url for article in candidates)
+        
+        enriched = 0
+        for article in candidates:
+            body = texts.get(article.url)
+            if body:
+                article.body = body
+                enriched += 1
+        
+        print(f"   Downloaded: {downloader.downloaded} • From cache: {downloader.cache_hits} • With text: {enriched}")
+        return articles
+    
+    def process_article(self, article):
+        """Geocode and classify one article; returns an Event, or None without a location"""
+        full_text = article.analysis_text
+        
+        # Extract location from text
+        slum_name, city, country, location_data = self.extract_location_from_text(full_text, article.language)
+        
+        if not location_data:
+            return None
+        
+        # Extract event details
+        event_type = self.extract_event_type(full_text, article.language)
+        affected_count = self.extract_affected_count(full_text)
+        
+        # Parse date
+        raw_date = article.published_at
+        try:
+            if 'T' in raw_date:
+                published_date = raw_date.split('T')[0]
+            else:
+                published_date = raw_date[:10]
+        except:
+            published_date = ''
+        
+        # Create display address
+        if slum_name:
+            address = f"{slum_name.title()}, {location_data['city']}, {location_data['country']}"
+        elif city:
+            address = f"{city.title()}, {location_data['country']}"
+        else:
+            address = location_data['country']
+        
+        return Event(
+            title=article.title,
+            description=article.description,
+            url=article.url,
+            date=published_date,
+            source=article.source,
+            slum_name=slum_name,
+            city=city,
+            country=country,
+            lat=location_data['lat'],
+            lon=location_data['lon'],
+            address=address,
+            location_type=location_data.get('type', 'unknown'),
+            event_type=event_type,
+            affected_count=affected_count,
+            found_by_query=article.search_query
+        )
+    
     def process_articles(self, articles):
-        """Process articles with database-only geocoding"""
+        """Process articles with database-only geocoding, checkpointing each batch of events
+        
+        articles may be any sized iterable (e.g. SpilledArticles); it is read one batch at a time.
+        """
         events = []
         
         print(f"\n📋 Processing {len(articles)} articles with database geocoding...\n")
         
-        processed_count = 0
-        geocoded_count = 0
-        
-        for i, article in enumerate(articles):
-            if i % 20 == 0 and i > 0:
-                print(f"   Processed {i}/{len(articles)} articles...")
-            
-            title = article.get('title', '')
-            description = article.get('description', '')
-            content = article.get('content', '')
-            full_text = article.get('full_text', f"{title} {description} {content}")
+        resumed_batches = 0
+        for batch_index, batch in enumerate(iter_batches(articles, PROCESS_BATCH_SIZE)):
+            start = batch_index * PROCESS_BATCH_SIZE
             
-            # Extract location from text
-            slum_name, city, country, location_data = self.extract_location_from_text(full_text)
+            batch_events = self.load_event_checkpoint(batch_index, batch)
+            if batch_events is None:
+                batch_events = [event for event in map(self.process_article, batch) if event]
+                self.save_event_checkpoint(batch_index, batch, batch_events)
+            else:
+                resumed_batches += 1
             
-            if location_data:
-                processed_count += 1
-                geocoded_count += 1
-                
-                # Extract event details
-                event_type = self.extract_event_type(full_text)
-                affected_count = self.extract_affected_count(full_text)
-                
-                # Parse date
-                raw_date = article.get('publishedAt', '')
-                try:
-                    if 'T' in raw_date:
-                        published_date = raw_date.split('T')[0]
-                    else:
-                        published_date = raw_date[:10]
-                except:
-                    published_date = datetime.now().strftime('%Y-%m-%d')
-                
-                # Create display address
-                if slum_name:
-                    address = f"{slum_name.title()}, {location_data['city']}, {location_data['country']}"
-                elif city:
-                    address = f"{city.title()}, {location_data['country']}"
-                else:
-                    address = location_data['country']
-                
-                # Create event
-                event = {
-                    'title': title[:150],
-                    'description': description[:200] if description else '',
-                    'url': article.get('url', ''),
-                    'date': published_date,
-                    'source': article.get('source', {}).get('name', 'Unknown'),
-                    'slum_name': slum_name,
-                    'city': city,
-                    'country': country,
-                    'coordinates': {
-                        'lat': location_data['lat'],
-                        'lon': location_data['lon'],
-                        'address': address,
-                        'location_type': location_data.get('type', 'unknown')
-                    },
-                    'event_type': event_type,
-                    'affected_count': affected_count,
-                    'full_text': full_text,
-                    'geocode_confidence': 'database',
-                    'found_by_query': article.get('search_query', 'unknown')
-                }
-                
-                events.append(event)
+            events.extend(batch_events)
+            if start + len(batch) < len(articles):
+                print(f"   Processed {start + len(batch)}/{len(articles)} articles...")
+        
+        if resumed_batches:
+            print(f"   ♻️  Resumed {resumed_batches} event batches from checkpoints")
+        
+        cache = self.extraction_cache
+        cache.save()
+        print(f"   🧠 Extraction cache: {cache.hits} hits • {cache.misses} misses • {len(cache.entries)} entries")
+        
+        processed_count = len(events)
         
         print(f"\n📊 PROCESSING RESULTS:")
         print(f"   Total articles: {len(articles)}")
@@ -739,31 +2276,180 @@ class RefinedSlumMapper:
         print(f"   Events ready to map: {len(events)}")
         
         # Statistics
+        self.events_df = self.build_events_frame(events)
         if events:
-            event_types = [e['event_type'] for e in events]
-            type_counts = Counter(event_types)
+            stats = self.event_statistics(self.events_df)
             
             print(f"\n🎯 EVENT TYPES:")
-            for event_type, count in type_counts.most_common():
+            for event_type, count in stats['type_counts'].items():
                 print(f"   {event_type}: {count}")
             
-            countries = [e['country'] for e in events if e['country']]
-            country_counts = Counter(countries)
-            
             print(f"\n🌍 COUNTRIES:")
-            for country, count in country_counts.most_common(10):
+            for country, count in stats['country_counts'].head(10).items():
                 print(f"   {country}: {count}")
             
             # Show location types
-            location_types = [e['coordinates']['location_type'] for e in events]
-            location_type_counts = Counter(location_types)
-            
             print(f"\n📍 LOCATION TYPES:")
-            for loc_type, count in location_type_counts.most_common():
+            for loc_type, count in stats['location_type_counts'].items():
                 print(f"   {loc_type}: {count}")
         
         return events
     
+    def build_events_frame(self, events):
+        """Build the event DataFrame that all statistics are computed from
+        
+        Repeated labels are stored as categoricals. lat_key/lon_key are the coordinates
+        rounded to 4 decimals; cluster_events groups them into distinct seed points.
+        """
+        df = pd.DataFrame({
+            'event_type': [e.event_type or 'other' for e in events],
+            'country': [e.country for e in events],
+            'source': [e.source for e in events],
+            'address': [e.address for e in events],
+            'location_type': [e.location_type for e in events],
+            'lat': [e.lat for e in events],
+            'lon': [e.lon for e in events],
+            'date': [e.date or '' for e in events],
+            'affected_count': [e.affected_count for e in events],
+        })
+        
+        for column in ('event_type', 'country', 'source', 'address', 'location_type'):
+            df[column] = df[column].astype('category')
+        df['lat'] = df['lat'].astype('float64')
+        df['lon'] = df['lon'].astype('float64')
+        df['lat_key'] = df['lat'].round(4)
+        df['lon_key'] = df['lon'].round(4)
+        df['date'] = df['date'].astype(str).str.slice(0, 10)
+        df['affected_count'] = pd.to_numeric(df['affected_count'], errors='coerce')
+        
+        return df
+    
+    def event_statistics(self, events_df):
+        """Compute event tallies with vectorized groupby operations over the event DataFrame"""
+        def counts(column):
+            tally = events_df.groupby(column, observed=True, sort=False).size()
+            return tally[tally > 0].sort_values(ascending=False, kind='stable')
+        
+        dated = events_df['date'][events_df['date'] != '']
+        if len(dated):
+            date_range = f"{dated.min()} to {dated.max()}"
+        else:
+            date_range = "Unknown"
+        
+        return {
+            'type_counts': counts('event_type'),
+            'country_counts': counts('country'),
+            'source_counts': counts('source'),
+            'location_counts': counts('address'),
+            'location_type_counts': counts('location_type'),
+            'date_range': date_range,
+        }
+    
+    def cluster_events(self, events, events_df):
+        """Cluster events whose coordinates lie within cluster_radius_km of a seed point
+        
+        Distinct coordinates are indexed in geohash buckets and visited busiest
+        first; each unassigned point becomes a seed that absorbs every unassigned
+        point within the radius. Returns clusters with an event-weighted centroid,
+        a display address and the indices of their member events.
+        """
+        points = events_df.groupby(['lat_key', 'lon_key'], sort=True).indices
+        order = sorted(points, key=lambda key: (-len(points[key]), key))
+        
+        index = GeohashIndex(self.cluster_radius_km)
+        for key in order:
+            index.add(key, *key)
+        
+        clusters = []
+        assigned = set()
+        for seed in order:
+            if seed in assigned:
+                continue
+            
+            member_points = [key for key in index.query(*seed) if key not in assigned]
+            assigned.update(member_points)
+            members = sorted(int(i) for key in member_points for i in points[key])
+            
+            lat = sum(events[i].lat for i in members) / len(members)
+            lon = sum(events[i].lon for i in members) / len(members)
+            
+            address_counts = Counter(events[i].address for i in members).most_common()
+            address = address_counts[0][0]
+            if len(address_counts) > 1:
+                address += f" (+{len(address_counts) - 1} nearby)"
+            
+            clusters.append({
+                'lat': round(lat, 5),
+                'lon': round(lon, 5),
+                'address': address,
+                'members': members
+            })
+        
+        return clusters
+    
+    def build_aggregate_cube(self, events_df):
+        """Pre-aggregate event counts and affected totals by day × type × country × location type
+        
+        Each dimension is a sorted list of its values; cells is a flat list of
+        [day, type, country, location_type, count, affected] rows with dimension
+        values given as indices, so the page can slice it without the events.
+        """
+        dimensions = ['date', 'event_type', 'country', 'location_type']
+        grouped = events_df.groupby(dimensions, observed=True, sort=True).agg(
+            count=('lat', 'size'),
+            affected=('affected_count', 'sum'),
+        ).reset_index()
+        
+        cube = {name: sorted(events_df[name].unique().tolist()) for name in dimensions}
+        columns = [pd.Index(cube[name]).get_indexer(grouped[name].astype(object)) for name in dimensions]
+        columns += [grouped['count'].to_numpy(), grouped['affected'].to_numpy()]
+        cells = pd.DataFrame(dict(enumerate(columns))).astype('int64').to_numpy().ravel().tolist()
+        
+        return {
+            'days': cube['date'],
+            'types': cube['event_type'],
+            'countries': cube['country'],
+            'location_types': cube['location_type'],
+            'cells': cells
+        }
+    
+    def build_time_index(self, events):
+        """Day and week buckets over events sorted by sort_events (newest first)
+        
+        Bucket i covers events[offsets[i]:offsets[i + 1]], so any run of buckets
+        is one contiguous slice. Undated events sort last and fall outside every
+        bucket. Weeks are keyed by their Monday.
+        """
+        days, day_offsets = [], []
+        weeks, week_offsets = [], []
+        
+        dated = 0
+        for i, event in enumerate(events):
+            day = event.display_date
+            if not day:
+                break
+            dated = i + 1
+            if days and days[-1] == day:
+                continue
+            days.append(day)
+            day_offsets.append(i)
+            
+            try:
+                week = datetime.strptime(day, '%Y-%m-%d')
+                week = (week - timedelta(days=week.weekday())).strftime('%Y-%m-%d')
+            except ValueError:
+                week = day
+            if not weeks or weeks[-1] != week:
+                weeks.append(week)
+                week_offsets.append(i)
+        
+        return {
+            'days': days,
+            'day_offsets': day_offsets + [dated],
+            'weeks': weeks,
+            'week_offsets': week_offsets + [dated]
+        }
+    
     def calculate_legend_intervals(self, event_counts):
         """Calculate dynamic legend intervals based on event counts"""
         if not event_counts:
@@ -810,64 +2496,419 @@ class RefinedSlumMapper:
                 (third * 2 + 1, max_count, '#ff6b6b', f'High ({third*2+1}+)')
             ]
     
-    def create_html_map(self, events, output_file='slum_news_map.html'):
-        """Create HTML map with refined visualization"""
+    def load_map_templates(self):
+        """Load and compile the page shell template and static map assets once per process"""
+        if RefinedSlumMapper._map_templates is None:
+            def read(name):
+                with open(os.path.join(TEMPLATE_DIR, name), 'r', encoding='utf-8') as f:
+                    return f.read()
+            
+            RefinedSlumMapper._map_templates = {
+                'html': string.Template(read('map.html')),
+                'css': read('map.css'),
+                'js': read('map.js'),
+                'overview': string.Template(read('overview.html')),
+            }
+        return RefinedSlumMapper._map_templates
+    
+    def write_static_assets(self, output_dir):
+        """Write map.css/map.js under content-hashed names and return their page-relative paths
+        
+        Files are only written when their content changed; superseded hashed copies are removed.
+        """
+        templates = self.load_map_templates()
+        asset_dir = os.path.join(output_dir, ASSET_DIR)
+        os.makedirs(asset_dir, exist_ok=True)
+        
+        hrefs = {}
+        for ext in ('css', 'js'):
+            content = templates[ext].encode('utf-8')
+            filename = f"map.{hashlib.sha256(content).hexdigest()[:12]}.{ext}"
+            path = os.path.join(asset_dir, filename)
+            
+            if not os.path.exists(path):
+                with open(path, 'wb') as f:
+                    f.write(content)
+                # Drop superseded versions, including their minified and compressed siblings
+                current_prefix = filename[:-len(ext)]
+                for stale in glob.glob(os.path.join(asset_dir, f"map.*.{ext}*")):
+                    if not os.path.basename(stale).startswith(current_prefix):
+                        os.remove(stale)
+            
+            hrefs[ext] = f"{ASSET_DIR}/{filename}"
+        
+        return hrefs
+    
+    def script_safe_json(self, json_text):
+        """Escape a JSON string for embedding inside an inline <script> element"""
+        return json_text.replace('</', '<\\/')
+    
+    def minify_css(self, css):
+        """Strip comments and redundant whitespace from CSS"""
+        css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+        css = re.sub(r'\s+', ' ', css)
+        css = re.sub(r'\s*([{};:,>])\s*', r'\1', css)
+        return css.replace(';}', '}').strip()
+    
+    def minify_js(self, js):
+        """Conservatively minify JavaScript: drop comment lines, indentation and blank lines
+        
+        Newlines are kept so automatic semicolon insertion behaves exactly as in the source.
+        """
+        lines = []
+        for line in js.splitlines():
+            line = line.strip()
+            if line and not line.startswith('//'):
+                lines.append(line)
+        return '\n'.join(lines)
+    
+    def minify_html(self, html):
+        """Collapse whitespace and comments in HTML, minifying inline scripts and compacting JSON data"""
+        parts = []
+        position = 0
+        for match in re.finditer(r'(<script\b[^>]*>)(.*?)(</script>)', html, flags=re.DOTALL):
+            parts.append(self._collapse_markup(html[position:match.start()]))
+            open_tag, body, close_tag = match.groups()
+            if 'application/json' in open_tag:
+                body = self.script_safe_json(json.dumps(json.loads(body), ensure_ascii=False, separators=(',', ':')))
+            else:
+                body = self.minify_js(body)
+            parts.append(self._collapse_markup(open_tag) + body + close_tag)
+            position = match.end()
+        parts.append(self._collapse_markup(html[position:]))
+        return ''.join(parts).strip()
+    
+    def _collapse_markup(self, markup):
+        markup = re.sub(r'<!--.*?-->', '', markup, flags=re.DOTALL)
+        markup = re.sub(r'\s+', ' ', markup)
+        return re.sub(r'>\s+<', '> <', markup)
+    
+    def write_compressed_siblings(self, path, data):
+        """Write .gz (and .br when brotli is installed) siblings at maximum compression"""
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        with open(path + '.gz', 'wb') as f:
+            f.write(compressed)
+        sizes = {'gz': len(compressed)}
+        
+        if brotli is not None:
+            compressed = brotli.compress(data, quality=11)
+            with open(path + '.br', 'wb') as f:
+                f.write(compressed)
+            sizes['br'] = len(compressed)
+        
+        return sizes
+    
+    def bundle_output(self, html_file, quiet=False):
+        """Minify the rendered page and its local assets, then write precompressed siblings
+        
+        Local CSS/JS references are replaced by minified `.min` copies (the source
+        copies are removed), inline JSON data is compacted, and every output gets
+        .gz/.br siblings. Prints byte sizes before and after unless quiet. The
+        minified asset paths are kept in bundled_assets for pages that share them.
+        """
+        output_dir = os.path.dirname(os.path.abspath(html_file))
+        with open(html_file, 'r', encoding='utf-8') as f:
+            html = f.read()
+        
+        report = []
+        
+        def bundle_asset(match):
+            href = match.group(2)
+            source_path = os.path.join(output_dir, href)
+            stem, ext = os.path.splitext(href)
+            min_href = f"{stem}.min{ext}"
+            min_path = os.path.join(output_dir, min_href)
+            
+            with open(source_path, 'r', encoding='utf-8') as f:
+                source = f.read()
+            minified = (self.minify_css(source) if ext == '.css' else self.minify_js(source)).encode('utf-8')
+            
+            with open(min_path, 'wb') as f:
+                f.write(minified)
+            os.remove(source_path)
+            self.bundled_assets[ext.lstrip('.')] = min_href
+            report.append((min_href, len(source.encode('utf-8')), len(minified),
+                           self.write_compressed_siblings(min_path, minified)))
+            return f'{match.group(1)}"{min_href}"'
+        
+        html = re.sub(rf'((?:href|src)=)"({ASSET_DIR}/[^"]+?(?<!\.min)\.(?:css|js))"', bundle_asset, html)
+        
+        original_size = os.path.getsize(html_file)
+        minified = self.minify_html(html).encode('utf-8')
+        with open(html_file, 'wb') as f:
+            f.write(minified)
+        report.insert(0, (os.path.basename(html_file), original_size, len(minified),
+                          self.write_compressed_siblings(html_file, minified)))
+        
+        if quiet:
+            return html_file
+        
+        print("\n📦 BUNDLE SIZES (bytes):")
+        for name, before, after, compressed in report:
+            line = f"   {name}: {before:,} → {after:,} minified • {compressed['gz']:,} gzip"
+            if 'br' in compressed:
+                line += f" • {compressed['br']:,} brotli"
+            print(line)
+        if brotli is None:
+            print("   (install 'brotli' to also write .br files)")
+        
+        return html_file
+    
+    def write_delta_feed(self, events, feed_dir=FEED_DIR):
+        """Write the events first seen in this run to a delta file and list it in feed.json
+        
+        IDs already published are kept in known_ids.json. The index is a JSON Feed
+        (https://jsonfeed.org/version/1.1) with one item per delta, newest first.
+        Returns the newly seen events (empty when there is nothing new).
+        """
+        os.makedirs(feed_dir, exist_ok=True)
+        known_path = os.path.join(feed_dir, 'known_ids.json')
+        known_ids = set(read_json(known_path) or [])
+        
+        # IDs published before they were keyed by dedup_key hashed the raw URL or title;
+        # events known under such an ID are not new, and are recorded under the current one
+        def legacy_id(event):
+            return hashlib.sha1((event.url or event.title).encode('utf-8')).hexdigest()[:16]
+        
+        new_events, migrated_ids = [], set()
+        for event in events:
+            if event.event_id in known_ids:
+                continue
+            if legacy_id(event) in known_ids:
+                migrated_ids.add(event.event_id)
+            else:
+                new_events.append(event)
+        if migrated_ids:
+            known_ids |= migrated_ids
+            write_json_atomic(known_path, sorted(known_ids))
+        
+        if not new_events:
+            print("\n📡 No new events since the last run; no delta written")
+            return new_events
+        
+        generated = datetime.now(timezone.utc).replace(microsecond=0)
+        filename = f"delta-{generated.strftime('%Y%m%dT%H%M%SZ')}.json"
+        delta_path = os.path.join(feed_dir, filename)
+        write_json_atomic(delta_path, {
+            'generated_at': generated.isoformat().replace('+00:00', 'Z'),
+            'count': len(new_events),
+            'events': [event.to_dict() for event in new_events]
+        })
+        write_json_atomic(known_path, sorted(known_ids.union(event.event_id for event in new_events)))
+        
+        feed_path = os.path.join(feed_dir, 'feed.json')
+        feed = read_json(feed_path) or {
+            'version': 'https://jsonfeed.org/version/1.1',
+            'title': 'permanence.dev - Slum News Map: new events',
+            'home_page_url': FEED_BASE_URL.rsplit('feeds/', 1)[0],
+            'feed_url': FEED_BASE_URL + 'feed.json',
+            'items': []
+        }
+        type_counts = Counter(event.event_type for event in new_events).most_common()
+        feed['items'].insert(0, {
+            'id': filename[:-len('.json')],
+            'url': FEED_BASE_URL + filename,
+            'title': f"{len(new_events)} new events",
+            'content_text': ', '.join(f"{event_type}: {count}" for event_type, count in type_counts),
+            'date_published': generated.isoformat().replace('+00:00', 'Z'),
+            'attachments': [{'url': FEED_BASE_URL + filename, 'mime_type': 'application/json'}]
+        })
+        
+        # Keep the index short and drop delta files it no longer lists
+        feed['items'] = feed['items'][:FEED_MAX_ITEMS]
+        listed = {item['id'] + '.json' for item in feed['items']}
+        for stale in glob.glob(os.path.join(feed_dir, 'delta-*.json')):
+            if os.path.basename(stale) not in listed:
+                os.remove(stale)
+        write_json_atomic(feed_path, feed)
+        
+        print(f"\n📡 Delta feed: {len(new_events)} new events → {delta_path}")
+        return new_events
+    
+    def rolling_bucket(self, events):
+        """Counts per rolling dimension (and in total) for one day's events"""
+        bucket = {'total': len(events)}
+        for dimension, attribute in ROLLING_DIMENSIONS.items():
+            bucket[dimension] = dict(Counter(getattr(event, attribute) or 'Unknown' for event in events))
+        return bucket
+    
+    def fold_bucket(self, totals, bucket, sign):
+        """Add (sign=1) or subtract (sign=-1) a day bucket from window totals, dropping zero counts"""
+        totals['total'] = totals.get('total', 0) + sign * bucket['total']
+        for dimension in ROLLING_DIMENSIONS:
+            counts = totals.setdefault(dimension, {})
+            for value, count in bucket[dimension].items():
+                counts[value] = counts.get(value, 0) + sign * count
+                if counts[value] == 0:
+                    del counts[value]
+    
+    def update_rolling_stats(self, new_events, all_events, today=None, path=ROLLING_STATS_FILE):
+        """Advance the 7/30/90-day windows to today and fold in events first seen this run
+        
+        Only the days that leave or enter a window are folded in, plus the new
+        events; the per-day buckets of the longest window (and any future-dated
+        days) are kept in the file for that. Without a saved state, the windows
+        are seeded from all events.
+        """
+        today = today or datetime.now(timezone.utc).date()
+        longest = max(ROLLING_WINDOWS)
+        state = read_json(path)
+        if state is None:
+            state = {'as_of': today.isoformat(), 'days': {},
+                     'windows': {str(n): self.rolling_bucket([]) for n in ROLLING_WINDOWS}}
+            new_events = all_events
+        
+        # Subtract the days that expire and add the (future-dated) days reached since the previous run
+        previous = datetime.strptime(state['as_of'], '%Y-%m-%d').date()
+        for n in ROLLING_WINDOWS:
+            first_kept = (today - timedelta(days=n - 1)).isoformat()
+            first_before = (previous - timedelta(days=n - 1)).isoformat()
+            for day, bucket in state['days'].items():
+                if first_before <= day < first_kept and day <= previous.isoformat():
+                    self.fold_bucket(state['windows'][str(n)], bucket, -1)
+                elif previous.isoformat() < day <= today.isoformat() and day >= first_kept:
+                    self.fold_bucket(state['windows'][str(n)], bucket, 1)
+        
+        oldest = (today - timedelta(days=longest - 1)).isoformat()
+        state['days'] = {day: bucket for day, bucket in state['days'].items() if day >= oldest}
+        state['as_of'] = today.isoformat()
+        
+        # Add the new events, grouped by the day they were published
+        by_day = defaultdict(list)
+        for event in new_events:
+            day = event.display_date
+            if day >= oldest:
+                by_day[day].append(event)
+        
+        for day, events in sorted(by_day.items()):
+            bucket = self.rolling_bucket(events)
+            if day in state['days']:
+                self.fold_bucket(state['days'][day], bucket, 1)
+            else:
+                state['days'][day] = bucket
+            for n in ROLLING_WINDOWS:
+                if (today - timedelta(days=n - 1)).isoformat() <= day <= state['as_of']:
+                    self.fold_bucket(state['windows'][str(n)], bucket, 1)
+        
+        write_json_atomic(path, state)
+        return state
+    
+    def rolling_trends_html(self, rolling):
+        """Left-panel trend block: window totals, and 7-day type counts against the 30-day weekly rate"""
+        if not rolling:
+            return ''
+        
+        windows = rolling['windows']
+        totals = ' • '.join(f"{n}d: <strong>{windows[str(n)]['total']}</strong>" for n in ROLLING_WINDOWS)
+        
+        rows = []
+        week, month = windows['7']['event_type'], windows['30']['event_type']
+        for event_type in sorted(set(week) | set(month), key=lambda t: (-week.get(t, 0), t)):
+            expected = month.get(event_type, 0) * 7 / 30
+            count = week.get(event_type, 0)
+            if count > expected * 1.25:
+                arrow = '<span style="color: #ff6b6b;">▲</span>'
+            elif count < expected * 0.75:
+                arrow = '<span style="color: #4dabf7;">▼</span>'
+            else:
+                arrow = '<span style="color: #999;">•</span>'
+            rows.append(f'<span class="event-tag {event_type}-tag">{event_type}</span> {count} {arrow}')
+        
+        return f"""
+        <h4>📅 Recent Activity</h4>
+        <p style="font-size: 12px;">{totals}</p>
+        <p style="font-size: 12px; line-height: 2;">{'<br>'.join(rows)}</p>
+        <p style="font-size: 11px; color: #999;">Last 7 days per type; ▲/▼ against the 30-day weekly rate</p>
+        """
+    
+    def sort_events(self, events):
+        """Order events deterministically: newest first, then by URL and title"""
+        events = sorted(events, key=lambda e: (e.url or '', e.title))
+        return sorted(events, key=lambda e: e.date or '', reverse=True)
+    
+    def render_fingerprint(self, events, renderer='auto', rolling=None):
+        """SHA-256 of the normalized event set plus the templates, marker settings and trend windows it is rendered with
+        
+        The module source is included too, since the legend, bar chart, trend and
+        region markup and the location database are generated here.
+        """
+        templates = self.load_map_templates()
+        digest = hashlib.sha256()
+        with open(os.path.abspath(__file__), 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+        for event in self.sort_events(events):
+            digest.update(json.dumps(event.to_dict(), sort_keys=True, ensure_ascii=False).encode('utf-8'))
+            digest.update(b'\n')
+        for name in ('html', 'css', 'js', 'overview'):
+            source = templates[name].template if name in ('html', 'overview') else templates[name]
+            digest.update(source.encode('utf-8'))
+        digest.update(f"{renderer}:{self.canvas_marker_threshold}:{CITY_PAGE_MIN_EVENTS}".encode('utf-8'))
+        if rolling:
+            digest.update(json.dumps(rolling['windows'], sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def render_hash_path(self, output_file):
+        return os.path.splitext(output_file)[0] + '.sha256'
+    
+    def render_is_current(self, output_file, fingerprint):
+        """True when the stored fingerprint for output_file matches, i.e. nothing would change"""
+        try:
+            with open(self.render_hash_path(output_file), 'r', encoding='utf-8') as f:
+                return f.read().strip() == fingerprint
+        except OSError:
+            return False
+    
+    def save_render_fingerprint(self, output_file, fingerprint):
+        with open(self.render_hash_path(output_file), 'w', encoding='utf-8') as f:
+            f.write(fingerprint + '\n')
+    
+    def create_html_map(self, events, output_file='slum_news_map.html', events_df=None, renderer='auto',
+                        rolling=None, asset_hrefs=None, scope_html='', zoom=2, quiet=False):
+        """Create HTML map with refined visualization
+        
+        renderer picks the marker style: 'divicon' (HTML markers), 'canvas'
+        (circle markers and count labels drawn on one canvas) or 'auto', which
+        uses canvas above canvas_marker_threshold markers. rolling adds the
+        recent-activity trend block from update_rolling_stats. Region pages pass
+        asset_hrefs to reuse already written assets instead of writing their own.
+        """
         if not events:
             print("\n⚠️ No events to map!")
             return None
         
+        # The time index needs events in sort_events order; the frame must follow the same order
+        ordered = self.sort_events(events)
+        if any(a is not b for a, b in zip(ordered, events)):
+            events, events_df = ordered, None
+        
         # Calculate average coordinates
-        valid_coords = [e for e in events if e['coordinates']['lat'] != 0 and e['coordinates']['lon'] != 0]
+        valid_coords = [e for e in events if e.lat != 0 and e.lon != 0]
         if valid_coords:
-            avg_lat = sum(e['coordinates']['lat'] for e in valid_coords) / len(valid_coords)
-            avg_lon = sum(e['coordinates']['lon'] for e in valid_coords) / len(valid_coords)
+            avg_lat = sum(e.lat for e in valid_coords) / len(valid_coords)
+            avg_lon = sum(e.lon for e in valid_coords) / len(valid_coords)
         else:
             avg_lat, avg_lon = 20, 0
         
-        # Prepare events JSON with proper date handling
-        for event in events:
-            # Ensure date is in proper format
-            if 'date' in event and event['date']:
-                try:
-                    if isinstance(event['date'], str):
-                        if 'T' in event['date']:
-                            event['iso_date'] = event['date']
-                            event['display_date'] = event['date'].split('T')[0]
-                        else:
-                            event['iso_date'] = event['date'] + "T00:00:00Z"
-                            event['display_date'] = event['date']
-                    else:
-                        event['iso_date'] = datetime.now().isoformat() + "Z"
-                        event['display_date'] = datetime.now().strftime('%Y-%m-%d')
-                except:
-                    event['iso_date'] = datetime.now().isoformat() + "Z"
-                    event['display_date'] = datetime.now().strftime('%Y-%m-%d')
-            else:
-                event['iso_date'] = datetime.now().isoformat() + "Z"
-                event['display_date'] = datetime.now().strftime('%Y-%m-%d')
-        
-        events_json = json.dumps(events, indent=2, ensure_ascii=False)
+        # Serialize events with display dates for the page
+        events_json = json.dumps(
+            [e.to_dict(include_display_dates=True) for e in events], indent=2, ensure_ascii=False
+        )
         
         # Statistics
-        dates = [e['display_date'] for e in events if e.get('display_date')]
-        if dates:
-            date_range = f"{min(dates)} to {max(dates)}"
-        else:
-            date_range = "Unknown"
-        
-        # Count event types for bar chart (EXCLUDE "other" category)
-        event_types = [e.get('event_type', 'other') for e in events]
-        type_counts = Counter(event_types)
+        if events_df is None:
+            events_df = self.build_events_frame(events)
+        stats = self.event_statistics(events_df)
+        date_range = stats['date_range']
+        type_counts = stats['type_counts']
         
-        # Filter out "other" for bar chart
-        filtered_type_counts = {k: v for k, v in type_counts.items() if k != 'other'}
+        # Bar chart data (EXCLUDE "other" category)
+        filtered_type_counts = type_counts[type_counts.index != 'other']
         
-        # Prepare data for bar chart
         bar_chart_data = []
-        if filtered_type_counts:
-            max_count = max(filtered_type_counts.values()) if filtered_type_counts else 1
+        if len(filtered_type_counts):
+            max_count = filtered_type_counts.max()
             
-            for event_type, count in sorted(filtered_type_counts.items(), key=lambda x: x[1], reverse=True):
+            for event_type, count in filtered_type_counts.items():
                 percentage = (count / len(events)) * 100
                 bar_chart_data.append({
                     'type': event_type,
@@ -876,16 +2917,9 @@ class RefinedSlumMapper:
                     'width': (count / max_count) * 100
                 })
         
-        # Calculate legend intervals
-        location_groups = {}
-        for event in events:
-            key = f"{event['coordinates']['lat']:.4f},{event['coordinates']['lon']:.4f}"
-            if key not in location_groups:
-                location_groups[key] = []
-            location_groups[key].append(event)
-        
-        event_counts = [len(group) for group in location_groups.values()]
-        legend_intervals = self.calculate_legend_intervals(event_counts)
+        # Markers are drawn per spatial cluster, so the legend follows cluster sizes
+        clusters = self.cluster_events(events, events_df)
+        legend_intervals = self.calculate_legend_intervals([len(c['members']) for c in clusters])
         
         # Generate legend HTML
         legend_html = ""
@@ -910,440 +2944,228 @@ class RefinedSlumMapper:
             </div>
             """
         
-        html_content = f"""<!DOCTYPE html>
-<html>
-<head>
-    <title>permanence.dev - Slum News Map</title>
-    <meta charset="utf-8" />
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css" />
-    <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
-    <style>
-        body {{ margin: 0; font-family: Arial, sans-serif; background: #1a1a1a; }}
-        #map {{ height: 100vh; width: 100%; }}
-        
-        /* COMBINED LEFT PANEL - Info + Legend + Bar Chart */
-        .left-panel {{
-            position: absolute; top: 80px; left: 10px;
-            background: rgba(30, 30, 30, 0.95); padding: 15px; border-radius: 8px;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.5); z-index: 1000;
-            max-width: 350px; border: 1px solid #444;
-            max-height: 80vh; overflow-y: auto;
-        }}
-        .left-panel h2 {{ 
-            margin: 0 0 15px 0; 
-            font-size: 24px; 
-            color: white; 
-            font-weight: bold;
-            letter-spacing: 0.5px;
-        }}
-        .left-panel h4 {{ margin: 15px 0 10px 0; font-size: 14px; color: #e0e0e0; padding-top: 12px; border-top: 1px solid #444; }}
-        .left-panel p {{ margin: 6px 0; font-size: 14px; line-height: 1.5; color: #e0e0e0; }}
-        .stat {{ font-weight: bold; color: #ff6b6b; font-size: 16px; }}
-        
-        /* LEGEND ITEMS */
-        .legend-item {{ 
-            display: flex; align-items: center; margin: 6px 0; font-size: 12px; color: #ccc;
-        }}
-        .legend-circle {{
-            width: 20px; height: 20px; border-radius: 50%;
-            margin-right: 8px; border: 2px solid white;
-        }}
-        
-        /* BAR CHART */
-        .bar-chart-row {{
-            display: flex; align-items: center; margin: 8px 0;
-        }}
-        .bar-chart-label {{
-            width: 100px; font-size: 12px; color: #ccc; text-transform: capitalize;
-        }}
-        .bar-chart-bar-container {{
-            flex-grow: 1; position: relative; height: 20px;
-            background: #2a2a2a; border-radius: 3px; overflow: hidden;
-        }}
-        .bar-chart-bar {{
-            height: 100%; transition: width 0.5s ease;
-        }}
-        .bar-chart-count {{
-            position: absolute; right: 5px; top: 2px;
-            font-size: 10px; color: white; font-weight: bold;
-        }}
-        
-        /* Event type bar colors */
-        .eviction-bar {{ background: linear-gradient(90deg, #ff6b6b, #ff8e8e); }}
-        .demolition-bar {{ background: linear-gradient(90deg, #ff922b, #ffb347); }}
-        .protest-bar {{ background: linear-gradient(90deg, #94d82d, #b2e057); }}
-        .fire-bar {{ background: linear-gradient(90deg, #c92a2a, #e03131); }}
-        .flood-bar {{ background: linear-gradient(90deg, #4dabf7, #74c0fc); }}
-        .land_rights-bar {{ background: linear-gradient(90deg, #fcc419, #ffd43b); }}
-        .disease-bar {{ background: linear-gradient(90deg, #cc5de8, #da77f2); }}
-        .development-bar {{ background: linear-gradient(90deg, #339af0, #4dabf7); }}
-        .other-bar {{ background: linear-gradient(90deg, #868e96, #adb5bd); }}
-        
-        /* SEARCH FILTER */
-        .search-panel {{
-            position: absolute; top: 10px; right: 10px;
-            background: rgba(30, 30, 30, 0.95); padding: 15px; border-radius: 8px;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.5); z-index: 1000;
-            width: 320px; border: 1px solid #444;
-        }}
-        .search-panel h3 {{ margin: 0 0 10px 0; font-size: 16px; color: #e0e0e0; }}
-        .search-box {{
-            width: 100%; padding: 8px; font-size: 14px;
-            border: 2px solid #555; border-radius: 4px;
-            box-sizing: border-box; background: #2a2a2a; color: #e0e0e0;
-        }}
-        .search-box:focus {{
-            outline: none; border-color: #ff6b6b;
-        }}
-        .filter-buttons {{
-            margin-top: 10px; display: flex; gap: 5px; flex-wrap: wrap;
-        }}
-        .filter-btn {{
-            padding: 6px 12px; font-size: 12px; border: 1px solid #555;
-            background: #2a2a2a; border-radius: 4px; cursor: pointer;
-            transition: all 0.2s; color: #e0e0e0;
-        }}
-        .filter-btn:hover {{ background: #3a3a3a; }}
-        .filter-btn.active {{ background: #ff6b6b; color: white; border-color: #ff6b6b; }}
-        .results-count {{
-            margin-top: 10px; font-size: 13px; color: #999;
-            padding-top: 8px; border-top: 1px solid #444;
-        }}
-        
-        /* EVENT TYPE TAGS */
-        .event-tag {{
-            display: inline-block; padding: 3px 8px; border-radius: 12px;
-            font-size: 11px; font-weight: bold; margin-right: 5px;
-            text-transform: uppercase;
-        }}
-        .eviction-tag {{ background: #ff6b6b; color: white; }}
-        .demolition-tag {{ background: #ff922b; color: white; }}
-        .fire-tag {{ background: #c92a2a; color: white; }}
-        .flood-tag {{ background: #4dabf7; color: white; }}
-        .protest-tag {{ background: #94d82d; color: white; }}
-        .land_rights-tag {{ background: #fcc419; color: black; }}
-        .disease-tag {{ background: #cc5de8; color: white; }}
-        .development-tag {{ background: #339af0; color: white; }}
-        .other-tag {{ background: #868e96; color: white; }}
-        
-        /* POPUP - DARK MODE */
-        .leaflet-popup-content-wrapper {{
-            background: #2a2a2a !important;
-            color: #e0e0e0 !important;
-            border: 1px solid #444;
-        }}
-        .leaflet-popup-tip {{ background: #2a2a2a !important; }}
-        .popup-content {{ min-width: 300px; max-width: 400px; }}
-        .popup-content h3 {{ margin: 0 0 10px 0; font-size: 16px; color: #ff6b6b; }}
-        .popup-content p {{ margin: 5px 0; font-size: 13px; line-height: 1.5; color: #e0e0e0; }}
-        .popup-content a {{ color: #4dabf7; text-decoration: none; font-weight: bold; }}
-        .popup-content a:hover {{ text-decoration: underline; }}
-        .popup-content hr {{ border: none; border-top: 1px solid #444; }}
-        .popup-meta {{ font-size: 12px; color: #999; }}
-        
-        /* DATA RANGE INFO */
-        .data-info {{
-            font-size: 11px; color: #999; margin-top: 8px; line-height: 1.4;
-            border-top: 1px solid #333; padding-top: 8px;
-        }}
-    </style>
-</head>
-<body>
-    <div class="left-panel">
-        <h2>permanence.dev</h2>
-        <p><strong>Total Events:</strong> <span class="stat">{len(events)}</span></p>
-        <p><strong>Date Range:</strong><br>{date_range}</p>
-        <p><strong>Event Types:</strong><br>
-            {' '.join([f'<span class="event-tag {event_type}-tag">{event_type}</span>' for event_type in type_counts.keys()])}
-        </p>
-        <div class="data-info">
-            Data Source: GDELT • {len(self.location_db)} locations<br>
-            <small>Note: GDELT returns recent news (typically 0-7 days)</small>
-        </div>
-        
-        <h4>📊 Event Intensity</h4>
-        {legend_html}
-        
-        <h4>📈 Event Type Distribution</h4>
-        <div style="margin-top: 10px;">
-            {bar_chart_html if bar_chart_data else '<p style="color: #999; font-size: 12px;">No specific event types found (only "other")</p>'}
-        </div>
-    </div>
-
-    <div class="search-panel">
-        <h3>🔍 Filter News</h3>
-        <input type="text" id="searchBox" class="search-box" placeholder="Search keywords...">
-        <div class="filter-buttons">
-            <button class="filter-btn active" onclick="filterBy('all')">All</button>
-            <button class="filter-btn" onclick="filterBy('eviction')">Evictions</button>
-            <button class="filter-btn" onclick="filterBy('demolition')">Demolitions</button>
-            <button class="filter-btn" onclick="filterBy('protest')">Protests</button>
-            <button class="filter-btn" onclick="filterBy('fire')">Fire</button>
-            <button class="filter-btn" onclick="filterBy('flood')">Flood</button>
-            <button class="filter-btn" onclick="filterBy('development')">Development</button>
-            <button class="filter-btn" onclick="filterBy('other')">Other</button>
-        </div>
-        <div class="results-count">
-            Showing <strong><span id="visibleCount">{len(events)}</span></strong> of {len(events)}
-        </div>
-        <div style="font-size: 12px; color: #999; margin-top: 8px;">
-            Event types: {', '.join([f'{k}: {v}' for k, v in type_counts.items()])}
-        </div>
-    </div>
-
-    <div id="map"></div>
-
-    <script>
-        const eventsData = {events_json};
-        const map = L.map('map').setView([{avg_lat}, {avg_lon}], 2);
-
-        // DARK MODE TILES - CartoDB Dark Matter
-        L.tileLayer('https://{{s}}.basemaps.cartocdn.com/dark_all/{{z}}/{{x}}/{{y}}{{r}}.png', {{
-            maxZoom: 19,
-            attribution: '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> &copy; <a href="https://carto.com/attributions">CARTO</a>'
-        }}).addTo(map);
-
-        // Store all markers and filtered markers
-        let allMarkers = [];
-        let currentFilter = 'all';
-        let currentSearch = '';
-
-        // Function to create markers for a given set of events
-        function createMarkers(events) {{
-            // Clear existing markers
-            allMarkers.forEach(marker => map.removeLayer(marker));
-            allMarkers = [];
-            
-            if (events.length === 0) {{
-                document.getElementById('visibleCount').textContent = 0;
-                return;
-            }}
-            
-            // Group events by location
-            const locationGroups = {{}};
-            events.forEach(event => {{
-                const key = `${{event.coordinates.lat.toFixed(4)}},${{event.coordinates.lon.toFixed(4)}}`;
-                if (!locationGroups[key]) {{
-                    locationGroups[key] = {{
-                        location: event.coordinates.address,
-                        coords: event.coordinates,
-                        events: []
-                    }};
-                }}
-                locationGroups[key].events.push(event);
-            }});
-            
-            // Calculate dynamic legend intervals
-            const eventCounts = Object.values(locationGroups).map(group => group.events.length);
-            const maxCount = Math.max(...eventCounts);
-            
-            function getIntensityColor(count) {{
-                if (maxCount <= 5) {{
-                    if (count <= 1) return '#4dabf7';
-                    if (count <= 3) return '#ff922b';
-                    return '#ff6b6b';
-                }} else if (maxCount <= 15) {{
-                    if (count <= 3) return '#4dabf7';
-                    if (count <= 7) return '#ff922b';
-                    return '#ff6b6b';
-                }} else if (maxCount <= 30) {{
-                    if (count <= 5) return '#4dabf7';
-                    if (count <= 15) return '#ff922b';
-                    return '#ff6b6b';
-                }} else if (maxCount <= 50) {{
-                    if (count <= 10) return '#4dabf7';
-                    if (count <= 25) return '#ff922b';
-                    return '#ff6b6b';
-                }} else {{
-                    const third = Math.floor(maxCount / 3);
-                    if (count <= third) return '#4dabf7';
-                    if (count <= third * 2) return '#ff922b';
-                    return '#ff6b6b';
-                }}
-            }}
-            
-            // Function to get tag class for event type
-            function getEventTagClass(eventType) {{
-                return eventType + '-tag';
-            }}
-            
-            // Function to format date properly
-            function formatDate(dateStr) {{
-                if (!dateStr) return 'Unknown date';
-                try {{
-                    const date = new Date(dateStr);
-                    if (isNaN(date.getTime())) return dateStr;
-                    return date.toLocaleDateString('en-US', {{ 
-                        year: 'numeric', 
-                        month: 'short', 
-                        day: 'numeric' 
-                    }});
-                }} catch (e) {{
-                    return dateStr;
-                }}
-            }}
-            
-            // Create markers
-            Object.values(locationGroups).forEach(group => {{
-                const eventCount = group.events.length;
-                const totalAffected = group.events.reduce((sum, e) => sum + (e.affected_count || 0), 0);
-                const intensityColor = getIntensityColor(eventCount);
-                
-                // Improved scaling: Use logarithmic scale for better differentiation
-                const minSize = 25;
-                const maxSize = 120;
-                const size = Math.min(maxSize, minSize + (Math.log(eventCount + 1) * 25));
-                
-                // Add transparency (0.7 opacity)
-                const iconHtml = `
-                    <div style="
-                        background-color: ${{intensityColor}};
-                        width: ${{size}}px;
-                        height: ${{size}}px;
-                        border-radius: 50%;
-                        border: 3px solid rgba(255, 255, 255, 0.9);
-                        box-shadow: 0 4px 12px rgba(0,0,0,0.6);
-                        display: flex;
-                        align-items: center;
-                        justify-content: center;
-                        font-size: ${{Math.min(22, 14 + Math.log(eventCount + 1) * 3)}}px;
-                        color: white;
-                        font-weight: bold;
-                        opacity: 0.7;
-                        transition: opacity 0.3s ease;
-                    " 
-                    onmouseover="this.style.opacity='0.9'" 
-                    onmouseout="this.style.opacity='0.7'"
-                    >${{eventCount}}</div>
-                `;
-                
-                const customIcon = L.divIcon({{
-                    html: iconHtml,
-                    className: 'custom-marker',
-                    iconSize: [size, size],
-                    iconAnchor: [size/2, size/2],
-                    popupAnchor: [0, -size/2]
-                }});
-                
-                let popupContent = `
-                    <div class="popup-content">
-                        <h3>📍 ${{group.location}}</h3>
-                        <p><strong>${{eventCount}} news item${{eventCount > 1 ? 's' : ''}}</strong></p>
-                        ${{totalAffected > 0 ? `<p>👥 Total affected: <strong>${{totalAffected.toLocaleString()}}</strong></p>` : ''}}
-                        <hr style="margin: 10px 0; border: none; border-top: 1px solid #444;">
-                `;
-                
-                group.events.forEach((event, idx) => {{
-                    const eventTag = event.event_type ? 
-                        `<span class="event-tag ${{getEventTagClass(event.event_type)}}">${{event.event_type}}</span>` : '';
-                    
-                    popupContent += `
-                        <div style="margin: 10px 0; padding: 10px 0; ${{idx > 0 ? 'border-top: 1px solid #444;' : ''}}">
-                            ${{eventTag}}
-                            <p style="margin: 5px 0 5px 0;"><strong>${{event.title}}</strong></p>
-                            <p class="popup-meta">
-                                📅 ${{formatDate(event.iso_date)}}
-                                ${{event.source && event.source !== 'Unknown' ? `• 📰 ${{event.source}}` : ''}}
-                            </p>
-                            ${{event.affected_count ? `<p style="margin: 3px 0; font-size: 12px; color: #ff6b6b;">👥 ${{event.affected_count.toLocaleString()}} people affected</p>` : ''}}
-                            <p style="margin: 5px 0 0 0;">
-                                <a href="${{event.url}}" target="_blank">Read article →</a>
-                            </p>
-                        </div>
-                    `;
-                }});
-                
-                popupContent += `</div>`;
-                
-                const marker = L.marker([group.coords.lat, group.coords.lon], {{ icon: customIcon }})
-                    .bindPopup(popupContent, {{ maxWidth: 400, maxHeight: 500 }});
-                
-                marker.addTo(map);
-                allMarkers.push(marker);
-            }});
-            
-            document.getElementById('visibleCount').textContent = events.length;
-        }}
-        
-        // Initial creation of markers with all events
-        createMarkers(eventsData);
-        
-        // FILTERING FUNCTIONALITY
-        function applyFilters() {{
-            let filteredEvents = eventsData;
-            
-            // Apply event type filter
-            if (currentFilter !== 'all') {{
-                filteredEvents = filteredEvents.filter(event => 
-                    event.event_type === currentFilter
-                );
-            }}
-            
-            // Apply search filter
-            if (currentSearch) {{
-                filteredEvents = filteredEvents.filter(event => 
-                    event.full_text.toLowerCase().includes(currentSearch.toLowerCase()) ||
-                    event.title.toLowerCase().includes(currentSearch.toLowerCase())
-                );
-            }}
-            
-            createMarkers(filteredEvents);
-        }}
-        
-        // Search box event
-        document.getElementById('searchBox').addEventListener('input', function(e) {{
-            currentSearch = e.target.value;
-            applyFilters();
-            
-            // Remove active class from filter buttons when searching
-            document.querySelectorAll('.filter-btn').forEach(btn => {{
-                btn.classList.remove('active');
-            }});
-        }});
-        
-        // Preset filter buttons
-        function filterBy(eventType) {{
-            // Update button states
-            document.querySelectorAll('.filter-btn').forEach(btn => {{
-                btn.classList.remove('active');
-            }});
-            event.target.classList.add('active');
-            
-            // Clear search box when filter is applied
-            document.getElementById('searchBox').value = '';
-            currentSearch = '';
-            
-            // Set current filter and apply
-            currentFilter = eventType;
-            applyFilters();
-        }}
-        
-        map.on('popupopen', function(e) {{
-            map.setView(e.popup.getLatLng(), Math.max(map.getZoom(), 6), {{ animate: true }});
-        }});
-    </script>
-</body>
-</html>"""
+        # Fill the precompiled page shell; CSS/JS are served as cacheable assets
+        templates = self.load_map_templates()
+        if asset_hrefs is None:
+            asset_hrefs = self.write_static_assets(os.path.dirname(os.path.abspath(output_file)))
+        
+        event_tags_html = ' '.join(
+            f'<span class="event-tag {event_type}-tag">{event_type}</span>' for event_type in type_counts.keys()
+        )
+        if not bar_chart_data:
+            bar_chart_html = '<p style="color: #999; font-size: 12px;">No specific event types found (only "other")</p>'
+        
+        if renderer == 'auto':
+            renderer = 'canvas' if len(clusters) > self.canvas_marker_threshold else 'divicon'
+        map_config = {'center': [avg_lat, avg_lon], 'zoom': zoom, 'renderer': renderer}
+        
+        html_content = templates['html'].substitute(
+            css_href=asset_hrefs['css'],
+            js_href=asset_hrefs['js'],
+            scope_html=scope_html,
+            total_events=len(events),
+            date_range=date_range,
+            event_tags_html=event_tags_html,
+            location_count=len(self.location_db),
+            legend_html=legend_html,
+            trends_html=self.rolling_trends_html(rolling),
+            bar_chart_html=bar_chart_html,
+            type_summary=', '.join(f'{k}: {v}' for k, v in type_counts.items()),
+            events_json=self.script_safe_json(events_json),
+            clusters_json=self.script_safe_json(json.dumps(clusters, ensure_ascii=False)),
+            map_config_json=self.script_safe_json(json.dumps(map_config)),
+            cube_json=self.script_safe_json(json.dumps(self.build_aggregate_cube(events_df), ensure_ascii=False)),
+            time_index_json=self.script_safe_json(json.dumps(self.build_time_index(events))),
+        )
         
         with open(output_file, 'w', encoding='utf-8') as f:
             f.write(html_content)
         
-        print(f"\n✅ Map saved: {output_file}")
+        if not quiet:
+            print(f"\n✅ Map saved: {output_file}")
+        return output_file
+    
+    def slugify(self, name):
+        """URL path segment for a place name: ASCII, lowercase, words joined by hyphens"""
+        name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+        return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-') or 'unknown'
+    
+    def region_pages(self, events):
+        """Group events into per-country and per-city page jobs
+        
+        Returns (kind, slug, title, events) tuples. Places are grouped by slug, so
+        spellings that differ only in case or accents share a page titled with the
+        most common one. City pages only cover events located at city or slum level,
+        in cities with at least CITY_PAGE_MIN_EVENTS.
+        """
+        groups = {'country': defaultdict(list), 'city': defaultdict(list)}
+        titles = {'country': defaultdict(Counter), 'city': defaultdict(Counter)}
+        for event in events:
+            places = []
+            if event.country:
+                places.append(('country', event.country))
+            if event.city and event.location_type in ('slum', 'city'):
+                places.append(('city', f"{event.city}, {event.country}" if event.country else event.city))
+            for kind, title in places:
+                slug = self.slugify(title)
+                groups[kind][slug].append(event)
+                titles[kind][slug][title] += 1
+        
+        pages = []
+        for kind in ('country', 'city'):
+            for slug, page_events in sorted(groups[kind].items()):
+                if kind == 'city' and len(page_events) < CITY_PAGE_MIN_EVENTS:
+                    continue
+                title = min(titles[kind][slug].items(), key=lambda item: (-item[1], item[0]))[0]
+                pages.append((kind, slug, title, page_events))
+        return pages
+    
+    def render_region_pages(self, events, output_file, renderer='auto'):
+        """Render a bundled page per country and city plus a lightweight overview page
+        
+        Pages live in country/<slug>/index.html and city/<slug>/index.html next to
+        output_file, link back to the published site root and reuse output_file's
+        bundled assets, so it must already have been bundled. Pages are rendered in
+        REGION_PAGE_WORKERS processes; stale page directories are removed first and
+        country/ and city/ always exist (with a .gitkeep), even without pages.
+        Returns the number of pages written.
+        """
+        output_dir = os.path.dirname(os.path.abspath(output_file))
+        for directory in list(REGION_PAGE_DIRS.values()) + [OVERVIEW_DIR]:
+            shutil.rmtree(os.path.join(output_dir, directory), ignore_errors=True)
+        
+        # Keep every region directory, even without pages, so publishing can always add it
+        for directory in REGION_PAGE_DIRS.values():
+            os.makedirs(os.path.join(output_dir, directory), exist_ok=True)
+            open(os.path.join(output_dir, directory, '.gitkeep'), 'w').close()
+        
+        pages = self.region_pages(events)
+        jobs = [(kind, slug, title, page_events, output_dir, renderer)
+                for kind, slug, title, page_events in pages]
+        
+        with ProcessPoolExecutor(max_workers=REGION_PAGE_WORKERS, initializer=init_region_worker,
+                                 initargs=(self.render_state(),)) as executor:
+            list(executor.map(render_region_page, jobs, chunksize=4))
+        
+        self.write_overview_page(pages, os.path.join(output_dir, OVERVIEW_DIR, 'index.html'))
+        
+        print(f"\n✅ Region pages saved: {sum(1 for p in pages if p[0] == 'country')} countries, "
+              f"{sum(1 for p in pages if p[0] == 'city')} cities, {OVERVIEW_DIR}/index.html")
+        return len(pages)
+    
+    def render_page(self, kind, slug, title, page_events, output_dir, renderer='auto'):
+        """Render and bundle one region page"""
+        page_file = os.path.join(output_dir, REGION_PAGE_DIRS[kind], slug, 'index.html')
+        os.makedirs(os.path.dirname(page_file), exist_ok=True)
+        scope_html = (f'<p><strong>{html_escape(title)}</strong> • '
+                      f'<a href="../../">Global map</a> • '
+                      f'<a href="../../{OVERVIEW_DIR}/">Overview</a></p>')
+        asset_hrefs = {ext: f"../../{href}" for ext, href in self.bundled_assets.items()}
+        self.create_html_map(page_events, page_file, renderer=renderer, asset_hrefs=asset_hrefs,
+                             scope_html=scope_html, zoom=REGION_PAGE_ZOOM[kind], quiet=True)
+        self.bundle_output(page_file, quiet=True)
+        return page_file
+    
+    def render_state(self):
+        """Copy of the mapper for page-rendering processes, without the fetch and extraction state"""
+        state = copy.copy(self)
+        state.extraction_cache = None
+        state.gazetteer = None
+        state.query_stats = None
+        state.events_df = None
+        return state
+    
+    def write_overview_page(self, pages, output_file):
+        """Write the global overview: one marker and one row per region page, without event data"""
+        regions = []
+        for kind, slug, title, page_events in pages:
+            located = [e for e in page_events if e.lat is not None and e.lon is not None]
+            if not located:
+                continue
+            regions.append({
+                'kind': kind,
+                'name': title,
+                'href': f"../{REGION_PAGE_DIRS[kind]}/{slug}/",
+                'count': len(page_events),
+                'lat': round(sum(e.lat for e in located) / len(located), 4),
+                'lon': round(sum(e.lon for e in located) / len(located), 4),
+            })
+        
+        def rows(kind):
+            return ''.join(
+                f'<li><a href="{r["href"]}">{html_escape(r["name"])}</a> <span class="stat">{r["count"]}</span></li>'
+                for r in sorted(regions, key=lambda r: (-r['count'], r['name'])) if r['kind'] == kind
+            )
+        
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        html_content = self.load_map_templates()['overview'].substitute(
+            css_href=f"../{self.bundled_assets['css']}",
+            total_events=sum(r['count'] for r in regions if r['kind'] == 'country'),
+            country_rows=rows('country'),
+            city_rows=rows('city'),
+            regions_json=self.script_safe_json(json.dumps(regions, ensure_ascii=False)),
+        )
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+        self.bundle_output(output_file, quiet=True)
         return output_file
 
 
-def main():
-    print("=" * 100)
-    print("                     permanence.dev - Slum News Mapper")
-    print("          GDELT Only • Full Date Range • Dynamic Legend • Bar Chart • 200+ Locations")
-    print("=" * 100)
+# Mapper used by a region page process, set once per process by init_region_worker
+_region_mapper = None
+
+
+def init_region_worker(mapper):
+    global _region_mapper
+    _region_mapper = mapper
+
+
+def render_region_page(job):
+    """Process pool entry point: render one (kind, slug, title, events, output_dir, renderer) job"""
+    return _region_mapper.render_page(*job)
+
+
+def run_local_shards(shard_count, args):
+    """Run every query shard as a separate local process and return their output files"""
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    processes = []
     
-    mapper = RefinedSlumMapper()
+    print(f"🧩 Starting {shard_count} local shard processes (logs in {SHARD_DIR}/)...")
+    for shard_index in range(shard_count):
+        command = [sys.executable, os.path.abspath(__file__), 'all',
+                   '--shard-index', str(shard_index), '--shard-count', str(shard_count)]
+        if args.enrich:
+            command.append('--enrich')
+        if args.resume:
+            command.append('--resume')
+        if args.gazetteer:
+            command += ['--gazetteer', args.gazetteer]
+        if args.sort_buffer:
+            command += ['--sort-buffer', str(args.sort_buffer)]
+        if args.max_requests is not None:
+            # Split the budget so all shards together stay within it
+            share = args.max_requests // shard_count + (shard_index < args.max_requests % shard_count)
+            command += ['--max-requests', str(share)]
+        
+        log = open(os.path.join(SHARD_DIR, f"shard-{shard_index}-of-{shard_count}.log"), 'w', encoding='utf-8')
+        processes.append((shard_index, subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT), log))
     
-    print(f"\n🏘️  Database: {len(mapper.location_db)} locations (slums, cities, countries)")
-    print(f"🌐 Sources: GDELT only")
-    print(f"📅 Searching all available dates (no date restriction)\n")
+    shard_files = []
+    for shard_index, process, log in processes:
+        returncode = process.wait()
+        log.close()
+        path = os.path.join(SHARD_DIR, f"shard-{shard_index}-of-{shard_count}.json")
+        if returncode == 0 and os.path.exists(path):
+            shard_files.append(path)
+        else:
+            print(f"   ⚠️ Shard {shard_index} failed (exit code {returncode}); see its log")
+    
+    return shard_files
+
+
+def fetch_stage(mapper, args):
+    """Search GDELT (optionally enriching articles) and save the article artifact"""
+    mapper.prepare_run_dir()
     
     # Search GDELT only
     articles = mapper.search_gdelt_only()
@@ -1351,42 +3173,109 @@ def main():
     if not articles:
         print("\n❌ No articles found from GDELT!")
         print("   Try adjusting search terms or check your internet connection.")
-        return
+        return None
+    
+    # Optionally fetch full article text, a batch at a time when articles are on disk
+    if mapper.enrich and isinstance(articles, SpilledArticles):
+        enriched = (article for batch in iter_batches(articles, PROCESS_BATCH_SIZE)
+                    for article in mapper.enrich_articles(batch))
+        articles = SpilledArticles.write(os.path.join(mapper.run_dir, 'articles-enriched.json'),
+                                         map(SpilledArticles.line, enriched))
+    elif mapper.enrich:
+        mapper.enrich_articles(articles)
+    
+    if mapper.shard_count <= 1:
+        saved = mapper.save_articles_artifact(articles)
+        if isinstance(articles, SpilledArticles):
+            articles = saved
+    return articles
+
+
+def process_stage(mapper, args, articles=None):
+    """Geocode and classify the fetched articles, unless the saved events are still current"""
+    if mapper.shard_count <= 1 and not args.force_process and os.path.exists(mapper.stage_path('articles.json')):
+        events = mapper.load_events_artifact(require_current=True)
+        if events is not None:
+            print(f"\n⏭️  Articles and keyword tables unchanged; reusing {len(events)} processed events")
+            mapper.events_df = mapper.build_events_frame(events)
+            return events
+    
+    if articles is None:
+        articles = mapper.load_articles_artifact()
+        if articles is None:
+            print(f"\n❌ No fetched articles in {STAGE_DIR}/; run the 'fetch' stage first")
+            return None
     
     # Process articles with database geocoding
     events = mapper.process_articles(articles)
+    if mapper.shard_count <= 1:
+        mapper.save_events_artifact(events)
+    return events
+
+
+def load_events_for(mapper):
+    """Processed events for the render and stats stages"""
+    events = mapper.load_events_artifact()
+    if events is None:
+        print(f"\n❌ No processed events in {STAGE_DIR}/; run the 'process' stage first")
+        return None
+    mapper.events_df = mapper.build_events_frame(events)
+    return events
+
+
+def render_stage(mapper, args, events=None):
+    """Write the data file, delta feed and bundled map, skipping the map when nothing changed"""
+    if events is None:
+        events = load_events_for(mapper)
+        if events is None:
+            return None
     
     if not events:
         print("\n❌ No events could be mapped!")
         print("   No articles contained recognizable location names.")
-        return
+        return None
     
     print("\n" + "=" * 100)
     print(f"🗺️  SUCCESSFULLY MAPPED {len(events)} NEWS ITEMS")
     print("=" * 100)
     
-    # Save data (JSON only for now - CSV generation disabled)
-    with open('slum_news_data.json', 'w', encoding='utf-8') as f:
-        json.dump(events, f, indent=2, ensure_ascii=False)
-    print("\n✅ Data saved: slum_news_data.json")
+    # Render in a stable order so identical events always produce identical files
+    events = mapper.sort_events(events)
+    mapper.events_df = mapper.build_events_frame(events)
+    
+    # Publish the events first seen in this run for incremental consumers
+    new_events = mapper.write_delta_feed(events)
+    rolling = mapper.update_rolling_stats(new_events, events)
+    
+    html_file = 'slum_news_map.html'
+    fingerprint = mapper.render_fingerprint(events, args.marker_renderer, rolling)
+    unchanged = not args.force_render and mapper.render_is_current(html_file, fingerprint)
+    
+    if unchanged:
+        print(f"\n⏭️  Events unchanged since the last render ({fingerprint[:12]}); skipping data, map and bundle")
+    else:
+        # Save data (JSON only for now - CSV generation disabled)
+        with open('slum_news_data.json', 'w', encoding='utf-8') as f:
+            json.dump([e.to_dict() for e in events], f, indent=2, ensure_ascii=False)
+        print("\n✅ Data saved: slum_news_data.json")
     
     # CSV generation DISABLED for simplified workflow
     # Uncomment below if you want CSV files later:
     # df_data = []
     # for event in events:
     #     df_data.append({
-    #         'Title': event['title'],
-    #         'Date': event['date'],
-    #         'Source': event['source'],
-    #         'Event Type': event['event_type'],
-    #         'Slum': event['slum_name'],
-    #         'City': event['city'],
-    #         'Country': event['country'],
-    #         'Location': event['coordinates']['address'],
-    #         'Latitude': event['coordinates']['lat'],
-    #         'Longitude': event['coordinates']['lon'],
-    #         'People Affected': event['affected_count'],
-    #         'URL': event['url'],
+    #         'Title': event.title,
+    #         'Date': event.date,
+    #         'Source': event.source,
+    #         'Event Type': event.event_type,
+    #         'Slum': event.slum_name,
+    #         'City': event.city,
+    #         'Country': event.country,
+    #         'Location': event.address,
+    #         'Latitude': event.lat,
+    #         'Longitude': event.lon,
+    #         'People Affected': event.affected_count,
+    #         'URL': event.url,
     #         'Geocode Source': 'database'
     #     })
     # 
@@ -1394,48 +3283,212 @@ def main():
     # df.to_csv('slum_news_data.csv', index=False, encoding='utf-8')
     # print("✅ Data saved: slum_news_data.csv")
     
-    # Create HTML map
-    mapper.create_html_map(events)
+    # Create HTML map and bundle it for publishing
+    if not unchanged and mapper.create_html_map(events, html_file, events_df=mapper.events_df,
+                                                renderer=args.marker_renderer, rolling=rolling):
+        mapper.bundle_output(html_file)
+        mapper.render_region_pages(events, html_file, renderer=args.marker_renderer)
+        mapper.save_render_fingerprint(html_file, fingerprint)
+    
+    print("\n" + "=" * 100)
+    if unchanged:
+        print("✅ SUCCESS! Existing files are up to date:")
+    else:
+        print("✅ SUCCESS! Files created:")
+    print("   - slum_news_map.html (interactive map with bar chart)")
+    print("   - slum_news_data.json (complete data)")
+    print(f"   - {FEED_DIR}/feed.json (JSON Feed of per-run deltas of new events)")
+    print(f"   - {ROLLING_STATS_FILE} (rolling 7/30/90-day statistics)")
+    print(f"   - {REGION_PAGE_DIRS['country']}/<name>/, {REGION_PAGE_DIRS['city']}/<name>/ and "
+          f"{OVERVIEW_DIR}/ (per-region pages and overview)")
+    print("\n📌 FEATURES:")
+    print("   • Removed date restrictions from GDELT queries")
+    print("   • 'Other' category can now be filtered separately")
+    print("   • Brand name: 'permanence.dev' (white, larger)")
+    print("   • Enhanced filtering: clicking a filter shows ONLY that event type")
+    print("   • Simplified version: CSV generation disabled")
+    print("=" * 100)
+    return events
+
+
+def stats_stage(mapper, events=None):
+    """Print detailed statistics for the processed events"""
+    if events is None:
+        events = load_events_for(mapper)
+        if not events:
+            return None
     
     # Detailed statistics
     print("\n📊 DETAILED STATISTICS:")
     print("=" * 100)
     
-    # Sources
-    sources = [e['source'] for e in events]
-    source_counts = Counter(sources)
+    stats = mapper.event_statistics(mapper.events_df)
     
+    # Sources
     print("\n📰 TOP SOURCES:")
-    for source, count in source_counts.most_common(10):
+    for source, count in stats['source_counts'].head(10).items():
         print(f"   {source}: {count}")
     
     # Event types
-    event_types = [e['event_type'] for e in events]
-    type_counts = Counter(event_types)
-    
     print("\n🎯 EVENT TYPES:")
-    for event_type, count in type_counts.most_common():
+    for event_type, count in stats['type_counts'].items():
         print(f"   {event_type}: {count}")
     
     # Locations
-    locations = [e['coordinates']['address'] for e in events]
-    location_counts = Counter(locations)
-    
     print("\n📍 TOP LOCATIONS:")
-    for location, count in location_counts.most_common(10):
+    for location, count in stats['location_counts'].head(10).items():
         print(f"   {location}: {count}")
     
-    print("\n" + "=" * 100)
-    print("✅ SUCCESS! Files created:")
-    print("   - slum_news_map.html (interactive map with bar chart)")
-    print("   - slum_news_data.json (complete data)")
-    print("\n📌 FEATURES:")
-    print("   • Removed date restrictions from GDELT queries")
-    print("   • 'Other' category can now be filtered separately")
-    print("   • Brand name: 'permanence.dev' (white, larger)")
-    print("   • Enhanced filtering: clicking a filter shows ONLY that event type")
-    print("   • Simplified version: CSV generation disabled")
+    # Rolling windows maintained by the render stage
+    rolling = read_json(ROLLING_STATS_FILE)
+    if rolling:
+        print(f"\n📈 ROLLING WINDOWS (as of {rolling['as_of']}):")
+        for n in ROLLING_WINDOWS:
+            window = rolling['windows'][str(n)]
+            top_types = sorted(window['event_type'].items(), key=lambda x: (-x[1], x[0]))[:3]
+            top_countries = sorted(window['country'].items(), key=lambda x: (-x[1], x[0]))[:3]
+            print(f"   {n:>2} days: {window['total']} events • "
+                  f"types: {', '.join(f'{k} {v}' for k, v in top_types) or '-'} • "
+                  f"countries: {', '.join(f'{k} {v}' for k, v in top_countries) or '-'}")
+
+
+def merge_stage(mapper, args, shard_files):
+    """Merge shard outputs into the stage artifacts, then render and print statistics"""
+    articles, events = mapper.merge_shards(shard_files)
+    mapper.save_articles_artifact(articles)
+    mapper.save_events_artifact(events)
+    
+    if render_stage(mapper, args, events):
+        stats_stage(mapper)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="permanence.dev slum news mapper",
+        epilog="Stages read and write their artifacts in %s/. Without a stage, 'all' runs." % STAGE_DIR
+    )
+    subparsers = parser.add_subparsers(dest='stage', metavar='STAGE')
+    
+    fetch_options = argparse.ArgumentParser(add_help=False)
+    fetch_options.add_argument('--enrich', action='store_true',
+                               help=f"download full text of articles whose snippet geocodes only coarsely (cached in {ARTICLE_CACHE_DIR}/)")
+    fetch_options.add_argument('--max-requests', type=int, metavar='N',
+                               help="stop searching after N GDELT requests (per process with --shard-count; "
+                                    "split between the processes with --local-shards)")
+    fetch_options.add_argument('--resume', action='store_true',
+                               help=f"reuse finished queries and event batches checkpointed in {RUN_DIR}/ by an interrupted run")
+    
+    sort_options = argparse.ArgumentParser(add_help=False)
+    sort_options.add_argument('--sort-buffer', type=int, metavar='MB',
+                              help="dedup and date-sort fetched articles in at most MB of memory, spilling "
+                                   f"sorted runs to disk (at least {MIN_SORT_BUFFER_MB}); other memory use "
+                                   "is not bounded")
+    
+    process_options = argparse.ArgumentParser(add_help=False)
+    process_options.add_argument('--force-process', action='store_true',
+                                 help="re-process articles even if they and the keyword tables are unchanged")
+    process_options.add_argument('--gazetteer', metavar='GEONAMES_FILE',
+                                 help="also geocode with places from a GeoNames dump (e.g. allCountries.txt)")
+    
+    render_options = argparse.ArgumentParser(add_help=False)
+    render_options.add_argument('--force-render', action='store_true',
+                                help="render the map even if the event set is unchanged since the last run")
+    render_options.add_argument('--marker-renderer', choices=MARKER_RENDERERS, default='auto',
+                                help="map marker style; 'auto' switches to canvas above --canvas-threshold markers")
+    render_options.add_argument('--canvas-threshold', type=int, default=CANVAS_MARKER_THRESHOLD,
+                                help="marker count above which 'auto' uses canvas markers (default: %(default)s)")
+    
+    subparsers.add_parser('fetch', parents=[fetch_options, sort_options],
+                          help="search GDELT and save the raw articles")
+    subparsers.add_parser('process', parents=[process_options, sort_options],
+                          help="geocode and classify the saved articles (skipped when its inputs are unchanged)")
+    subparsers.add_parser('render', parents=[render_options],
+                          help="write the data file, delta feed and map from the processed events")
+    subparsers.add_parser('stats', help="print statistics for the processed events")
+    
+    all_parser = subparsers.add_parser('all', parents=[fetch_options, sort_options, process_options, render_options],
+                                       help="run fetch, process, render and stats (the default)")
+    all_parser.add_argument('--shard-index', type=int, default=0,
+                            help="index of the query shard to run (0-based)")
+    all_parser.add_argument('--shard-count', type=int, default=1,
+                            help=f"number of query shards; a shard writes {SHARD_DIR}/shard-I-of-N.json and does not render")
+    all_parser.add_argument('--local-shards', type=int, metavar='N',
+                            help="run N shards as parallel local processes, then merge them")
+    
+    merge_parser = subparsers.add_parser('merge', parents=[render_options],
+                                         help="merge shard outputs and render the combined map")
+    merge_parser.add_argument('shard_files', nargs='+', metavar='SHARD_FILE')
+    
+    # Options without a stage (e.g. a bare --enrich) belong to 'all'
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in STAGES + ['-h', '--help']:
+        argv = ['all'] + argv
+    args = parser.parse_args(argv)
+    
+    shard_index = getattr(args, 'shard_index', 0)
+    shard_count = getattr(args, 'shard_count', 1)
+    if not 0 <= shard_index < shard_count:
+        parser.error("--shard-index must be between 0 and --shard-count - 1")
+    sort_buffer_mb = getattr(args, 'sort_buffer', None)
+    if sort_buffer_mb is not None and sort_buffer_mb < MIN_SORT_BUFFER_MB:
+        parser.error(f"--sort-buffer must be at least {MIN_SORT_BUFFER_MB} MB")
+    max_requests = getattr(args, 'max_requests', None)
+    if max_requests is not None and max_requests < 0:
+        parser.error("--max-requests must not be negative")
+    
     print("=" * 100)
+    print("                     permanence.dev - Slum News Mapper")
+    print("          GDELT Only • Full Date Range • Dynamic Legend • Bar Chart • 200+ Locations")
+    print("=" * 100)
+    
+    mapper = RefinedSlumMapper(max_requests_per_run=max_requests, enrich=getattr(args, 'enrich', False), resume=getattr(args, 'resume', False),
+                               shard_index=shard_index, shard_count=shard_count,
+                               canvas_marker_threshold=getattr(args, 'canvas_threshold', CANVAS_MARKER_THRESHOLD),
+                               gazetteer_path=getattr(args, 'gazetteer', None), sort_buffer_mb=sort_buffer_mb)
+    
+    print(f"\n🏘️  Database: {len(mapper.location_db)} locations (slums, cities, countries)")
+    if mapper.gazetteer:
+        print(f"🗺️  Gazetteer: {len(mapper.gazetteer.names):,} GeoNames places")
+    
+    if args.stage == 'fetch':
+        print(f"🌐 Sources: GDELT only")
+        print(f"📅 Searching all available dates (no date restriction)\n")
+        fetch_stage(mapper, args)
+        mapper.mark_run_complete()
+    elif args.stage == 'process':
+        process_stage(mapper, args)
+    elif args.stage == 'render':
+        render_stage(mapper, args)
+    elif args.stage == 'stats':
+        stats_stage(mapper)
+    elif args.stage == 'merge':
+        merge_stage(mapper, args, args.shard_files)
+    elif args.local_shards:
+        # Fan out over local processes, then merge their outputs
+        merge_stage(mapper, args, run_local_shards(args.local_shards, args))
+    else:
+        print(f"🌐 Sources: GDELT only")
+        print(f"📅 Searching all available dates (no date restriction)\n")
+        articles = fetch_stage(mapper, args)
+        if not articles:
+            if shard_count > 1:
+                mapper.write_shard([], [])
+            mapper.mark_run_complete()
+            return
+        
+        events = process_stage(mapper, args, articles)
+        
+        # A shard stops here; the merge stage renders the combined map
+        if shard_count > 1:
+            mapper.write_shard(articles, events)
+            mapper.mark_run_complete()
+            return
+        
+        # Fetch and process are done; only they read checkpoints
+        mapper.mark_run_complete()
+        
+        if render_stage(mapper, args, events):
+            stats_stage(mapper)
 
 
 if __name__ == "__main__":
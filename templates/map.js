@@ -0,0 +1,588 @@
+// Per-run data is embedded in the page as JSON script elements
+const eventsData = JSON.parse(document.getElementById('events-data').textContent);
+const clustersData = JSON.parse(document.getElementById('clusters-data').textContent);
+const mapConfig = JSON.parse(document.getElementById('map-config').textContent);
+const cube = JSON.parse(document.getElementById('cube-data').textContent);
+const timeIndex = JSON.parse(document.getElementById('time-index').textContent);
+const map = L.map('map').setView(mapConfig.center, mapConfig.zoom);
+
+// DARK MODE TILES - CartoDB Dark Matter
+L.tileLayer('https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png', {
+    maxZoom: 19,
+    attribution: '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> &copy; <a href="https://carto.com/attributions">CARTO</a>'
+}).addTo(map);
+
+// Spatial clusters are computed at build time; tag each event with its cluster
+clustersData.forEach((cluster, clusterId) => {
+    cluster.members.forEach(index => { eventsData[index].cluster = clusterId; });
+});
+
+// Current filter state; markers live in one layer group per event type
+let currentFilter = 'all';
+let currentSearch = '';
+const SEARCH_DEBOUNCE_MS = 200;
+
+// Filter/search state the markers on screen were last updated for
+let shownFilter = 'all';
+let shownSearch = '';
+let shownWindow = null;
+
+// Selected time window: null for all dates, else the event slice [lo, hi) and its first/last day
+let timeWindow = null;
+
+// Function to get tag class for event type
+function getEventTagClass(eventType) {
+    return eventType + '-tag';
+}
+
+// Function to format date properly
+function formatDate(dateStr) {
+    if (!dateStr) return 'Unknown date';
+    try {
+        const date = new Date(dateStr);
+        if (isNaN(date.getTime())) return dateStr;
+        return date.toLocaleDateString('en-US', { 
+            year: 'numeric', 
+            month: 'short', 
+            day: 'numeric' 
+        });
+    } catch (e) {
+        return dateStr;
+    }
+}
+
+// Popup HTML is built on first open and cached per cluster and filter state
+const POPUP_CACHE_LIMIT = 500;
+const popupCache = new Map();
+
+function buildPopupContent(group) {
+    const eventCount = group.events.length;
+    const totalAffected = group.events.reduce((sum, e) => sum + (e.affected_count || 0), 0);
+
+    let popupContent = `
+        <div class="popup-content">
+            <h3>📍 ${group.location}</h3>
+            <p><strong>${eventCount} news item${eventCount > 1 ? 's' : ''}</strong></p>
+            ${totalAffected > 0 ? `<p>👥 Total affected: <strong>${totalAffected.toLocaleString()}</strong></p>` : ''}
+            <hr style="margin: 10px 0; border: none; border-top: 1px solid #444;">
+    `;
+
+    group.events.forEach((event, idx) => {
+        const eventTag = event.event_type ? 
+            `<span class="event-tag ${getEventTagClass(event.event_type)}">${event.event_type}</span>` : '';
+
+        popupContent += `
+            <div style="margin: 10px 0; padding: 10px 0; ${idx > 0 ? 'border-top: 1px solid #444;' : ''}">
+                ${eventTag}
+                <p style="margin: 5px 0 5px 0;"><strong>${event.title}</strong></p>
+                <p class="popup-meta">
+                    📅 ${formatDate(event.iso_date)}
+                    ${event.source && event.source !== 'Unknown' ? `• 📰 ${event.source}` : ''}
+                </p>
+                ${event.affected_count ? `<p style="margin: 3px 0; font-size: 12px; color: #ff6b6b;">👥 ${event.affected_count.toLocaleString()} people affected</p>` : ''}
+                <p style="margin: 5px 0 0 0;">
+                    <a href="${event.url}" target="_blank">Read article →</a>
+                </p>
+            </div>
+        `;
+    });
+
+    popupContent += `</div>`;
+    return popupContent;
+}
+
+// Events of one cluster that match a filter, search and time window
+function clusterEvents(clusterId, filter, search, span) {
+    search = search.toLowerCase();
+    const members = span ? clustersData[clusterId].members.filter(i => i >= span.lo && i < span.hi)
+        : clustersData[clusterId].members;
+    return members.map(i => eventsData[i]).filter(event =>
+        (filter === 'all' || event.event_type === filter) &&
+        (!search || event.full_text.toLowerCase().includes(search) || event.title.toLowerCase().includes(search))
+    );
+}
+
+function lazyPopup(clusterId) {
+    return () => {
+        const windowKey = shownWindow ? shownWindow.lo + '-' + shownWindow.hi : 'all';
+        const key = shownFilter + '|' + shownSearch + '|' + windowKey + '|' + clusterId;
+        let content = popupCache.get(key);
+        if (content === undefined) {
+            if (popupCache.size >= POPUP_CACHE_LIMIT) popupCache.clear();
+            content = buildPopupContent({
+                location: clustersData[clusterId].address,
+                events: clusterEvents(clusterId, shownFilter, shownSearch, shownWindow)
+            });
+            popupCache.set(key, content);
+        }
+        return content;
+    };
+}
+
+// Counts matching events per cluster. Runs inside the filter worker, or on the
+// main thread when workers are unavailable; it must not use page globals.
+// Per-type counts are only gathered for searches; otherwise the charts read the cube.
+// Events are sorted by date, so a time window is the index range [lo, hi).
+function countVisible(index, filter, search, lo, hi) {
+    const counts = new Map();
+    const typeCounts = search ? {} : null;
+    const end = hi === undefined ? index.types.length : hi;
+    for (let i = lo || 0; i < end; i++) {
+        if (filter !== 'all' && index.types[i] !== filter) continue;
+        if (search && !index.texts[i].includes(search)) continue;
+        counts.set(index.clusters[i], (counts.get(index.clusters[i]) || 0) + 1);
+        if (typeCounts) typeCounts[index.types[i]] = (typeCounts[index.types[i]] || 0) + 1;
+    }
+    return { clusterIds: Array.from(counts.keys()), counts: Array.from(counts.values()), typeCounts: typeCounts };
+}
+
+function filterWorkerMain() {
+    let index = null;
+    self.onmessage = function(e) {
+        if (e.data.index) {
+            index = e.data.index;
+            return;
+        }
+        const result = countVisible(index, e.data.filter, e.data.search, e.data.lo, e.data.hi);
+        self.postMessage(Object.assign({ id: e.data.id, filter: e.data.filter, search: e.data.search }, result));
+    };
+}
+
+// Compact search index: event type, cluster and lowercased searchable text per event
+const filterIndex = { types: [], clusters: [], texts: [] };
+eventsData.forEach(event => {
+    filterIndex.types.push(event.event_type);
+    filterIndex.clusters.push(event.cluster);
+    filterIndex.texts.push(event.full_text.toLowerCase() + '\u0000' + event.title.toLowerCase());
+});
+
+// Filtering runs in a worker built from this script's own functions; the
+// page falls back to filtering inline if workers cannot be created
+let filterWorker = null;
+let latestRequest = 0;
+try {
+    const source = countVisible.toString() + '\n(' + filterWorkerMain.toString() + ')();';
+    filterWorker = new Worker(URL.createObjectURL(new Blob([source], { type: 'text/javascript' })));
+    filterWorker.onmessage = function(e) {
+        if (e.data.id === latestRequest) showCounts(e.data);
+    };
+    filterWorker.onerror = function() {
+        filterWorker = null;
+        applyFilters();
+    };
+    filterWorker.postMessage({ index: filterIndex });
+} catch (e) {
+    filterWorker = null;
+}
+
+// AGGREGATE CUBE
+// Totals for a filter come from the pre-aggregated day × type × country × location
+// type cells, so their cost does not depend on the number of events
+const CUBE_STRIDE = 6;
+
+function cubeSlice(filter, span) {
+    const slice = { total: 0, affected: 0, byType: {}, byCountry: {} };
+    const cells = cube.cells;
+    for (let i = 0; i < cells.length; i += CUBE_STRIDE) {
+        if (span) {
+            const day = cube.days[cells[i]];
+            if (!day || day < span.firstDay || day > span.lastDay) continue;
+        }
+        const type = cube.types[cells[i + 1]];
+        if (filter !== 'all' && type !== filter) continue;
+        const country = cube.countries[cells[i + 2]];
+        const count = cells[i + 4];
+        slice.total += count;
+        slice.affected += cells[i + 5];
+        slice.byType[type] = (slice.byType[type] || 0) + count;
+        slice.byCountry[country] = (slice.byCountry[country] || 0) + count;
+    }
+    return slice;
+}
+
+// Same markup as the bar chart rendered into the page ("other" is left out)
+function renderBarChart(byType, total) {
+    const rows = Object.entries(byType)
+        .filter(([type, count]) => type !== 'other' && count > 0)
+        .sort((a, b) => b[1] - a[1]);
+    const container = document.getElementById('barChart');
+
+    if (rows.length === 0) {
+        container.innerHTML = '<p style="color: #999; font-size: 12px;">No specific event types found (only "other")</p>';
+        return;
+    }
+
+    const maxCount = rows[0][1];
+    container.innerHTML = rows.map(([type, count]) => `
+        <div class="bar-chart-row">
+            <div class="bar-chart-label">${type}</div>
+            <div class="bar-chart-bar-container">
+                <div class="bar-chart-bar ${type}-bar" style="width: ${(count / maxCount) * 100}%"></div>
+                <div class="bar-chart-count">${count} (${((count / total) * 100).toFixed(1)}%)</div>
+            </div>
+        </div>
+    `).join('');
+}
+
+// Mirrors calculate_legend_intervals in the generator
+function legendIntervals(maxCount) {
+    if (maxCount <= 5) {
+        return [['#4dabf7', 'Single (1)'], ['#ff922b', 'Few (2-3)'], ['#ff6b6b', 'Several (4-5)']];
+    } else if (maxCount <= 15) {
+        return [['#4dabf7', 'Low (1-3)'], ['#ff922b', 'Medium (4-7)'], ['#ff6b6b', 'High (8-15)']];
+    } else if (maxCount <= 30) {
+        return [['#4dabf7', 'Low (1-5)'], ['#ff922b', 'Medium (6-15)'], ['#ff6b6b', 'High (16-30)']];
+    } else if (maxCount <= 50) {
+        return [['#4dabf7', 'Low (1-10)'], ['#ff922b', 'Medium (11-25)'], ['#ff6b6b', 'High (26-50)']];
+    }
+    const third = Math.floor(maxCount / 3);
+    return [
+        ['#4dabf7', `Low (1-${third})`],
+        ['#ff922b', `Medium (${third + 1}-${third * 2})`],
+        ['#ff6b6b', `High (${third * 2 + 1}+)`]
+    ];
+}
+
+function renderLegend(maxCount) {
+    document.getElementById('legend').innerHTML = legendIntervals(maxCount).map(([color, label]) => `
+        <div class="legend-item">
+            <div class="legend-circle" style="background-color: ${color};"></div>
+            <span>${label}</span>
+        </div>
+    `).join('');
+}
+
+// Marker colour follows the largest visible group
+function getIntensityColor(count, maxCount) {
+    if (maxCount <= 5) {
+        if (count <= 1) return '#4dabf7';
+        if (count <= 3) return '#ff922b';
+        return '#ff6b6b';
+    } else if (maxCount <= 15) {
+        if (count <= 3) return '#4dabf7';
+        if (count <= 7) return '#ff922b';
+        return '#ff6b6b';
+    } else if (maxCount <= 30) {
+        if (count <= 5) return '#4dabf7';
+        if (count <= 15) return '#ff922b';
+        return '#ff6b6b';
+    } else if (maxCount <= 50) {
+        if (count <= 10) return '#4dabf7';
+        if (count <= 25) return '#ff922b';
+        return '#ff6b6b';
+    } else {
+        const third = Math.floor(maxCount / 3);
+        if (count <= third) return '#4dabf7';
+        if (count <= third * 2) return '#ff922b';
+        return '#ff6b6b';
+    }
+}
+
+// Improved scaling: Use logarithmic scale for better differentiation
+function markerSize(eventCount) {
+    const minSize = 25;
+    const maxSize = 120;
+    return Math.min(maxSize, minSize + (Math.log(eventCount + 1) * 25));
+}
+
+function labelFontSize(eventCount) {
+    return Math.min(22, 14 + Math.log(eventCount + 1) * 3);
+}
+
+function createIcon(eventCount, intensityColor) {
+    const size = markerSize(eventCount);
+
+    // Add transparency (0.7 opacity)
+    const iconHtml = `
+        <div style="
+            background-color: ${intensityColor};
+            width: ${size}px;
+            height: ${size}px;
+            border-radius: 50%;
+            border: 3px solid rgba(255, 255, 255, 0.9);
+            box-shadow: 0 4px 12px rgba(0,0,0,0.6);
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            font-size: ${labelFontSize(eventCount)}px;
+            color: white;
+            font-weight: bold;
+            opacity: 0.7;
+            transition: opacity 0.3s ease;
+        " 
+        onmouseover="this.style.opacity='0.9'" 
+        onmouseout="this.style.opacity='0.7'"
+        >${eventCount}</div>
+    `;
+
+    return L.divIcon({
+        html: iconHtml,
+        className: 'custom-marker',
+        iconSize: [size, size],
+        iconAnchor: [size/2, size/2],
+        popupAnchor: [0, -size/2]
+    });
+}
+
+// Canvas mode: circles and their count labels are drawn on one shared canvas
+// instead of one DOM element per marker
+const useCanvas = mapConfig.renderer === 'canvas';
+const canvasRenderer = useCanvas ? L.canvas({ padding: 0.5 }) : null;
+
+const CountMarker = useCanvas ? L.CircleMarker.extend({
+    // Draw the event count on top of the circle each time the canvas repaints it
+    _updatePath: function() {
+        L.CircleMarker.prototype._updatePath.call(this);
+        const renderer = this._renderer;
+        if (!renderer._drawing || this._empty()) return;
+        const ctx = renderer._ctx;
+        ctx.font = `bold ${labelFontSize(this.options.count)}px sans-serif`;
+        ctx.fillStyle = 'white';
+        ctx.textAlign = 'center';
+        ctx.textBaseline = 'middle';
+        ctx.fillText(this.options.count, this._point.x, this._point.y);
+    }
+}) : null;
+
+function createClusterMarker(cluster) {
+    if (!useCanvas) return L.marker([cluster.lat, cluster.lon]);
+
+    const marker = new CountMarker([cluster.lat, cluster.lon], {
+        renderer: canvasRenderer,
+        count: 0,
+        radius: 0,
+        color: 'rgba(255, 255, 255, 0.9)',
+        weight: 3,
+        fillOpacity: 0.7
+    });
+    marker.on('mouseover', () => marker.setStyle({ fillOpacity: 0.9 }));
+    marker.on('mouseout', () => marker.setStyle({ fillOpacity: 0.7 }));
+    return marker;
+}
+
+function updateClusterMarker(marker, count, color) {
+    if (!useCanvas) {
+        marker.setIcon(createIcon(count, color));
+        return;
+    }
+    marker.options.count = count;
+    marker.setStyle({ fillColor: color });
+    marker.setRadius(markerSize(count) / 2);
+}
+
+// One layer group per filter; cluster markers are created the first time they are visible
+const filterLayers = {};
+let activeLayer = null;
+
+function getFilterLayer(filter) {
+    if (!filterLayers[filter]) {
+        filterLayers[filter] = { layer: L.layerGroup(), markers: new Map() };
+    }
+    return filterLayers[filter];
+}
+
+function getClusterMarker(entry, clusterId) {
+    let state = entry.markers.get(clusterId);
+    if (!state) {
+        const cluster = clustersData[clusterId];
+        state = {
+            marker: createClusterMarker(cluster)
+                .bindPopup(lazyPopup(clusterId), { maxWidth: 400, maxHeight: 500 }),
+            count: 0,
+            color: null
+        };
+        entry.markers.set(clusterId, state);
+    }
+    return state;
+}
+
+// FILTERING FUNCTIONALITY
+// Counting happens off the main thread; only the marker updates run here
+function applyFilters() {
+    const request = { id: ++latestRequest, filter: currentFilter, search: currentSearch.toLowerCase() };
+    if (timeWindow) {
+        request.lo = timeWindow.lo;
+        request.hi = timeWindow.hi;
+    }
+    pendingWindows.set(request.id, timeWindow);
+    if (filterWorker) {
+        filterWorker.postMessage(request);
+    } else {
+        showCounts(Object.assign(request, countVisible(filterIndex, request.filter, request.search, request.lo, request.hi)));
+    }
+}
+
+// Shows the filter's layer and only touches markers whose count or colour changed
+function showCounts(result) {
+    const entry = getFilterLayer(result.filter);
+    if (activeLayer !== entry) {
+        if (activeLayer) map.removeLayer(activeLayer.layer);
+        entry.layer.addTo(map);
+        activeLayer = entry;
+    }
+    shownFilter = result.filter;
+    shownSearch = result.search;
+    shownWindow = pendingWindows.get(result.id) || null;
+    pendingWindows.clear();
+
+    const counts = new Map();
+    result.clusterIds.forEach((clusterId, i) => counts.set(clusterId, result.counts[i]));
+    const maxCount = Math.max(0, ...result.counts);
+
+    // Hide markers whose cluster has no visible events
+    entry.markers.forEach((state, clusterId) => {
+        if (state.count > 0 && !counts.has(clusterId)) {
+            entry.layer.removeLayer(state.marker);
+            state.count = 0;
+        }
+    });
+
+    let visibleTotal = 0;
+    counts.forEach((count, clusterId) => {
+        visibleTotal += count;
+        const state = getClusterMarker(entry, clusterId);
+        const color = getIntensityColor(count, maxCount);
+        if (count !== state.count || color !== state.color) {
+            updateClusterMarker(state.marker, count, color);
+            state.color = color;
+        }
+        if (state.count === 0) entry.layer.addLayer(state.marker);
+        state.count = count;
+    });
+
+    // Counts and charts come from cube slices; only searches need the worker's per-event counts
+    const slice = result.typeCounts ? null : cubeSlice(result.filter, shownWindow);
+    const shownTotal = slice ? slice.total : visibleTotal;
+    document.getElementById('visibleCount').textContent = shownTotal;
+    renderBarChart(slice ? slice.byType : result.typeCounts, shownTotal);
+    renderLegend(maxCount);
+}
+
+// TIME WINDOW
+// Slider positions run oldest (0) to newest; buckets in the index run newest first
+const PLAY_INTERVAL_MS = 800;
+const pendingWindows = new Map();
+const timeFrom = document.getElementById('timeFrom');
+const timeTo = document.getElementById('timeTo');
+let timeBuckets = null;
+let playTimer = null;
+
+function setGranularity(granularity) {
+    timeBuckets = granularity === 'week'
+        ? { keys: timeIndex.weeks, offsets: timeIndex.week_offsets }
+        : { keys: timeIndex.days, offsets: timeIndex.day_offsets };
+    const last = Math.max(0, timeBuckets.keys.length - 1);
+    [timeFrom, timeTo].forEach(slider => { slider.max = last; });
+    timeFrom.value = 0;
+    timeTo.value = last;
+}
+
+function updateTimeWindow() {
+    const count = timeBuckets.keys.length;
+    let from = Number(timeFrom.value);
+    let to = Number(timeTo.value);
+    if (from > to) [from, to] = [to, from];
+
+    const label = document.getElementById('timeLabel');
+    if (from === 0 && to === count - 1) {
+        timeWindow = null;
+        label.textContent = 'All dates';
+    } else {
+        const newest = count - 1 - to;
+        const oldest = count - 1 - from;
+        const lo = timeBuckets.offsets[newest];
+        const hi = timeBuckets.offsets[oldest + 1];
+        timeWindow = { lo: lo, hi: hi, firstDay: eventsData[hi - 1].display_date, lastDay: eventsData[lo].display_date };
+        label.textContent = `${formatDate(timeWindow.firstDay)} – ${formatDate(timeWindow.lastDay)}`;
+    }
+    applyFilters();
+}
+
+// Playback moves the selected window forward one bucket per tick, keeping its width
+function togglePlayback() {
+    const button = document.getElementById('timePlay');
+    if (playTimer) {
+        clearInterval(playTimer);
+        playTimer = null;
+        button.textContent = '▶';
+        return;
+    }
+
+    const last = timeBuckets.keys.length - 1;
+    const width = Math.abs(Number(timeTo.value) - Number(timeFrom.value));
+    if (width >= last) {
+        // Nothing to move through: start from the oldest bucket instead
+        timeFrom.value = 0;
+        timeTo.value = 0;
+    } else if (Math.max(Number(timeFrom.value), Number(timeTo.value)) >= last) {
+        timeFrom.value = 0;
+        timeTo.value = width;
+    }
+    updateTimeWindow();
+
+    button.textContent = '⏸';
+    playTimer = setInterval(() => {
+        const from = Math.min(Number(timeFrom.value), Number(timeTo.value));
+        const to = Math.max(Number(timeFrom.value), Number(timeTo.value));
+        if (to >= last) {
+            togglePlayback();
+            return;
+        }
+        timeFrom.value = from + 1;
+        timeTo.value = to + 1;
+        updateTimeWindow();
+    }, PLAY_INTERVAL_MS);
+}
+
+if (timeIndex.days.length > 1) {
+    setGranularity('day');
+    timeFrom.addEventListener('input', updateTimeWindow);
+    timeTo.addEventListener('input', updateTimeWindow);
+    document.getElementById('timeGranularity').addEventListener('change', function(e) {
+        setGranularity(e.target.value);
+        updateTimeWindow();
+    });
+    document.getElementById('timePlay').addEventListener('click', togglePlayback);
+} else {
+    document.getElementById('timePanel').style.display = 'none';
+}
+
+// Initial display with all events
+applyFilters();
+
+// Search box event (debounced so typing does not refilter on every keystroke)
+let searchTimer = null;
+document.getElementById('searchBox').addEventListener('input', function(e) {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => {
+        currentSearch = e.target.value;
+        applyFilters();
+    }, SEARCH_DEBOUNCE_MS);
+
+    // Remove active class from filter buttons when searching
+    document.querySelectorAll('.filter-btn').forEach(btn => {
+        btn.classList.remove('active');
+    });
+});
+
+// Preset filter buttons
+function filterBy(eventType) {
+    // Update button states
+    document.querySelectorAll('.filter-btn').forEach(btn => {
+        btn.classList.remove('active');
+    });
+    event.target.classList.add('active');
+
+    // Clear search box when filter is applied
+    clearTimeout(searchTimer);
+    document.getElementById('searchBox').value = '';
+    currentSearch = '';
+
+    // Set current filter and apply
+    currentFilter = eventType;
+    applyFilters();
+}
+
+map.on('popupopen', function(e) {
+    map.setView(e.popup.getLatLng(), Math.max(map.getZoom(), 6), { animate: true });
+});